@@ -34,13 +34,48 @@
 #
 
 from __future__ import print_function, unicode_literals, absolute_import, division
-from . import printers
-from . import flat_containers
-from . import unordered_containers
-from . import intrusive_1_55
-from . import intrusive_1_40
-from . import multi_index_1_42
 from .utils import register_printers, add_trivial_printer, options, last_supported_boost_version
-from . import datetime
-from . import variant
-from . import wave_1_71
+from .utils import add_lazy_printer_module, import_all_printer_modules
+from . import snapshot, flat_find, bitset
+
+#
+# Printer modules are imported on first use of one of their types.
+# Keep these lists in sync with the template names and namespaces of the printers in each module.
+#
+add_lazy_printer_module('printers', [
+    'boost::iterator_range', 'boost::optional', 'boost::reference_wrapper', 'boost::logic::tribool',
+    'boost::intrusive_ptr', 'boost::scoped_ptr', 'boost::scoped_array', 'boost::shared_ptr',
+    'boost::weak_ptr', 'boost::shared_array', 'boost::weak_array', 'boost::circular_buffer',
+    'boost::array', 'boost::container::small_vector', 'boost::container::small_vector_base',
+    'boost::container::static_vector', 'boost::dynamic_bitset', 'boost::uuids::uuid'])
+add_lazy_printer_module('flat_containers', [
+    'boost::container::flat_set', 'boost::container::flat_map',
+    'boost::container::container_detail::vector_iterator',
+    'boost::container::container_detail::vector_const_iterator',
+    'boost::container::container_detail::vec_iterator', 'boost::container::vec_iterator'])
+add_lazy_printer_module('unordered_containers', [
+    'boost::unordered::unordered_map', 'boost::unordered::unordered_multimap',
+    'boost::unordered::unordered_set', 'boost::unordered::unordered_multiset',
+    'boost::unordered::iterator_detail::iterator', 'boost::unordered::iterator_detail::c_iterator'])
+add_lazy_printer_module('intrusive_1_55', [
+    'boost::intrusive::avl_set_base_hook', 'boost::intrusive::avl_set_member_hook',
+    'boost::intrusive::bs_set_base_hook', 'boost::intrusive::bs_set_member_hook',
+    'boost::intrusive::list_base_hook', 'boost::intrusive::list_member_hook',
+    'boost::intrusive::slist_base_hook', 'boost::intrusive::slist_member_hook',
+    'boost::intrusive::set_base_hook', 'boost::intrusive::set_member_hook',
+    'boost::intrusive::splay_set_base_hook', 'boost::intrusive::splay_set_member_hook',
+    'boost::intrusive::unordered_set_base_hook', 'boost::intrusive::unordered_set_member_hook',
+    'boost::intrusive::list_iterator', 'boost::intrusive::slist_iterator',
+    'boost::intrusive::tree_iterator', 'boost::intrusive::list', 'boost::intrusive::slist'],
+    ['boost::intrusive'])
+add_lazy_printer_module('intrusive_1_40', [
+    'boost::intrusive::set', 'boost::intrusive::tree_iterator', 'boost::intrusive::list',
+    '^boost::intrusive::list_iterator'])
+add_lazy_printer_module('multi_index_1_42', ['boost::multi_index::multi_index_container'])
+add_lazy_printer_module('datetime', [
+    'boost::posix_time::time_duration', 'boost::gregorian::date', 'boost::posix_time::ptime'])
+add_lazy_printer_module('variant', ['boost::variant'])
+add_lazy_printer_module('wave_1_71', [
+    'boost::wave::util::flex_string', 'boost::wave::util::file_position',
+    'boost::wave::cpplexer::lex_token', 'boost::wave::util::AllocatorStringStorage',
+    'boost::wave::util::CowString'])
@@ -0,0 +1,248 @@
+# encoding: utf-8
+
+#
+# boost::dynamic_bitset: decoding of the block storage, renderings and bit queries
+#
+# The blocks of a dynamic_bitset are read from the storage of its std::vector in one
+# bulk read, then decoded by python. The printer renders them according to the
+# boost-bitset-format parameter, and the $boost_bitset_* convenience functions answer
+# queries from the same decoded blocks, without inferior calls.
+#
+
+from __future__ import print_function, absolute_import, division
+import binascii
+import struct
+import gdb
+from .utils import *
+
+block_formats = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+
+class Bitset_Format_Parameter(gdb.Parameter):
+    """
+    Rendering of boost::dynamic_bitset by the boost printers.
+
+    children: one child per bit (the default)
+    bits: a string of bits, the highest one first, like boost::to_string()
+    hex: a hexadecimal number
+    ranges: the number of set bits, and the ranges of set bits, e.g. {0-5, 7, 100-199}
+    """
+    set_doc = 'Set how boost printers render boost::dynamic_bitset.'
+    show_doc = 'Show how boost printers render boost::dynamic_bitset.'
+
+    def __init__(self):
+        super(Bitset_Format_Parameter, self).__init__(
+            'boost-bitset-format', gdb.COMMAND_DATA, gdb.PARAM_ENUM, ['children', 'bits', 'hex', 'ranges'])
+        self.value = 'children'
+
+    def get_set_string(self):
+        return ''
+
+    def get_show_string(self, svalue):
+        return 'boost::dynamic_bitset is printed as: ' + svalue + '.'
+
+
+bitset_format = Bitset_Format_Parameter()
+
+
+class Bitset_Bits(object):
+    """
+    Bits of a dynamic_bitset: `num_bits` bits, in the list of `block_bits`-bit integers `blocks`,
+    lowest bits first. Bits past `num_bits` are cleared.
+    """
+    def __init__(self, blocks, num_bits, block_bits):
+        self.blocks = blocks
+        self.num_bits = num_bits
+        self.block_bits = block_bits
+        self.full_block = (1 << block_bits) - 1
+        if num_bits % block_bits and blocks:
+            self.blocks[-1] &= (1 << (num_bits % block_bits)) - 1
+
+    def test(self, pos):
+        if not 0 <= pos < self.num_bits:
+            raise gdb.GdbError('bit {} out of range (size {})'.format(pos, self.num_bits))
+        return (self.blocks[pos // self.block_bits] >> (pos % self.block_bits)) & 1
+
+    def count(self):
+        return sum(bin(block).count('1') for block in self.blocks)
+
+    def find_next(self, pos):
+        """Position of the first set bit after `pos`, or -1 if there is none (like find_next())"""
+        pos += 1
+        block_idx = pos // self.block_bits
+        if pos < 0 or block_idx >= len(self.blocks):
+            return -1
+        block = self.blocks[block_idx] >> (pos % self.block_bits) << (pos % self.block_bits)
+        while not block:
+            block_idx += 1
+            if block_idx == len(self.blocks):
+                return -1
+            block = self.blocks[block_idx]
+        return block_idx * self.block_bits + (block & -block).bit_length() - 1
+
+    def find_first(self):
+        return self.find_next(-1)
+
+    def bits(self):
+        """Generate the bits, lowest first"""
+        for block_idx, block in enumerate(self.blocks):
+            for bit_idx in xrange(min(self.block_bits, self.num_bits - block_idx * self.block_bits)):
+                yield (block >> bit_idx) & 1
+
+    def ranges(self):
+        """Generate the (first, last) positions of the runs of set bits"""
+        start = None
+        for block_idx, block in enumerate(self.blocks):
+            base = block_idx * self.block_bits
+            if block == self.full_block and start is not None:
+                continue
+            if block == 0 and start is None:
+                continue
+            for bit_idx in xrange(self.block_bits):
+                if (block >> bit_idx) & 1:
+                    if start is None:
+                        start = base + bit_idx
+                elif start is not None:
+                    yield start, base + bit_idx - 1
+                    start = None
+        if start is not None:
+            yield start, self.num_bits - 1
+
+    def to_int(self):
+        # a single conversion of the whole bitset, instead of shifting in each block
+        data = b''.join(struct.pack('>' + block_formats[self.block_bits // 8], block)
+                        for block in reversed(self.blocks))
+        return int(binascii.hexlify(data), 16) if data else 0
+
+    def to_bit_string(self):
+        return bin(self.to_int())[2:].zfill(self.num_bits) if self.num_bits else ''
+
+    def to_hex_string(self):
+        return '0x{:0{}x}'.format(self.to_int(), max(1, (self.num_bits + 3) // 4))
+
+    def to_ranges_string(self):
+        return '{' + ', '.join(str(first) if first == last else '{}-{}'.format(first, last)
+                               for first, last in self.ranges()) + '}'
+
+
+def vector_storage(v):
+    """Get the pointer to the first element of std::vector `v` (libstdc++ or libc++), or None"""
+    for path in [['_M_impl', '_M_start'], ['__begin_']]:
+        try:
+            p = v
+            for name in path:
+                p = p[name]
+            return p
+        except gdb.error:
+            pass
+    return None
+
+
+def read_bitset(value):
+    """
+    Read the bits of boost::dynamic_bitset `value`, as a Bitset_Bits.
+
+    The blocks are read at once from the storage of the block vector when its layout
+    is known, else through the printer of the vector.
+    """
+    num_bits = int(value['m_num_bits'])
+    block_type = get_basic_type(value['m_bits'].type).template_argument(0)
+    block_bits = 8 * block_type.sizeof
+    block_count = (num_bits + block_bits - 1) // block_bits
+    if block_count == 0:
+        return Bitset_Bits([], num_bits, block_bits)
+    start = vector_storage(value['m_bits'])
+    if start is not None and block_type.sizeof in block_formats:
+        try:
+            data = read_memory_bulk(intptr(start), block_count * block_type.sizeof)
+            fmt = '{}{}{}'.format(target_byte_order(), block_count, block_formats[block_type.sizeof])
+            return Bitset_Bits(list(struct.unpack(fmt, data)), num_bits, block_bits)
+        except gdb.MemoryError:
+            pass
+    data_vis = gdb.default_visualizer(value['m_bits'])
+    if data_vis is None:
+        raise gdb.GdbError('cannot read the blocks of: ' + str(value.type))
+    blocks = [int(block) for _, block in data_vis.children()][:block_count]
+    return Bitset_Bits(blocks, num_bits, block_bits)
+
+
+def get_bitset(value):
+    """
+    Read the bits of boost::dynamic_bitset `value`, or of the one it refers or points to.
+
+    Raises:
+      gdb.GdbError, if `value` is not a dynamic_bitset.
+    """
+    if get_basic_type(value.type).code == gdb.TYPE_CODE_PTR:
+        value = value.dereference()
+    if template_name(value.type) != 'boost::dynamic_bitset':
+        raise gdb.GdbError('not a boost::dynamic_bitset: ' + str(value.type))
+    return read_bitset(value)
+
+
+class Bitset_Function(gdb.Function):
+    """Base of the dynamic_bitset convenience functions: they return query(bits, *args) as a long"""
+    def __init__(self, name):
+        super(Bitset_Function, self).__init__(name)
+
+    def invoke(self, value, *args):
+        result = self.query(get_bitset(value), *[int(arg) for arg in args])
+        return gdb.Value(result).cast(lookup_type('long'))
+
+
+class Bitset_Count_Function(Bitset_Function):
+    """
+    Number of set bits of a boost::dynamic_bitset.
+
+    Usage: $boost_bitset_count(BITSET)
+    """
+    def __init__(self):
+        super(Bitset_Count_Function, self).__init__('boost_bitset_count')
+
+    def query(self, bits):
+        return bits.count()
+
+
+class Bitset_Test_Function(Bitset_Function):
+    """
+    Value (0 or 1) of bit POS of a boost::dynamic_bitset.
+
+    Usage: $boost_bitset_test(BITSET, POS)
+    """
+    def __init__(self):
+        super(Bitset_Test_Function, self).__init__('boost_bitset_test')
+
+    def query(self, bits, pos):
+        return bits.test(pos)
+
+
+class Bitset_Find_First_Function(Bitset_Function):
+    """
+    Position of the first set bit of a boost::dynamic_bitset, or -1 if there is none.
+
+    Usage: $boost_bitset_find_first(BITSET)
+    """
+    def __init__(self):
+        super(Bitset_Find_First_Function, self).__init__('boost_bitset_find_first')
+
+    def query(self, bits):
+        return bits.find_first()
+
+
+class Bitset_Find_Next_Function(Bitset_Function):
+    """
+    Position of the first set bit after POS of a boost::dynamic_bitset, or -1 if there is none.
+
+    Usage: $boost_bitset_find_next(BITSET, POS)
+    """
+    def __init__(self):
+        super(Bitset_Find_Next_Function, self).__init__('boost_bitset_find_next')
+
+    def query(self, bits, pos):
+        return bits.find_next(pos)
+
+
+Bitset_Count_Function()
+Bitset_Test_Function()
+Bitset_Find_First_Function()
+Bitset_Find_Next_Function()
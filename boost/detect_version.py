@@ -8,6 +8,9 @@ import stat
 import tempfile
 import shlex
 import shutil
+import json
+import re
+from .elf import Elf_File
 
 cpp_template = u"""
 #include <boost/version.hpp>
@@ -32,8 +35,114 @@ def unpack_boost_version(boost_version):
     return major, minor, patchlevel
 
 
-def detect_boost_version():
-    """Try to compile simple boost program to automatically detect boost version"""
+def find_boost_version_header(cppflags):
+    """Find boost/version.hpp in the include directories of CPPFLAGS, then in the usual system ones
+
+    :param cppflags: preprocessor flags, as in the CPPFLAGS environment variable
+    :return: path of the header, or None if it was not found
+    """
+    include_dirs = []
+    args = shlex.split(cppflags)
+    for i, arg in enumerate(args):
+        for opt in ('-I', '-isystem', '-idirafter'):
+            if arg == opt and i + 1 < len(args):
+                include_dirs.append(args[i + 1])
+            elif arg.startswith(opt) and len(arg) > len(opt):
+                include_dirs.append(arg[len(opt):])
+    for var in ('CPLUS_INCLUDE_PATH', 'CPATH'):
+        include_dirs.extend(d for d in os.environ.get(var, '').split(os.pathsep) if d)
+    include_dirs.extend(['/usr/local/include', '/usr/include'])
+
+    for include_dir in include_dirs:
+        header = os.path.join(include_dir, 'boost', 'version.hpp')
+        if os.path.isfile(header):
+            return os.path.realpath(header)
+    return None
+
+
+def read_boost_version_header(header):
+    """Parse the BOOST_VERSION define of boost/version.hpp
+
+    :param header: path of boost/version.hpp
+    :return: (major, minor, patchlevel), or None if the define was not found
+    """
+    with open(header, 'r', encoding='utf-8', errors='replace') as header_file:
+        m = re.search(r'^\s*#\s*define\s+BOOST_VERSION\s+(\d+)', header_file.read(), re.MULTILINE)
+    return unpack_boost_version(int(m.group(1))) if m else None
+
+
+# Macro definition string, as found in .debug_macro/.debug_str when compiling with -g3
+boost_version_macro_re = re.compile(br'(?<![A-Za-z0-9_])BOOST_VERSION[ \t]+(\d+)')
+# Traces of boost in strings of the debug info: include paths, mangled and qualified names,
+# and the name of the boost namespace itself, among the null-terminated strings of .debug_str
+boost_marker_re = re.compile(br'/boost/|N5boost|boost::|(?<![^\0])boost\0')
+
+
+def scan_object_file(filename):
+    """Look for boost in the DWARF debug info of an ELF object file
+
+    The debug sections are searched in place, in the mapped file, and the search stops at the
+    first section that answers the question.
+
+    :param filename: path of the object file
+    :return: (uses_boost, boost_version); boost_version is None unless the object file
+        contains macro information (e.g. when compiled with -g3). uses_boost is only False
+        when the object file has no debug info, or when its strings were all searched and
+        hold no trace of boost.
+    """
+    try:
+        elf_file = Elf_File(filename)
+    except (IOError, OSError, ValueError):
+        return False, None
+    with elf_file:
+        if elf_file.get_section('.debug_info') is None:
+            return False, None
+        try:
+            for section_name in ('.debug_macro', '.debug_macinfo', '.debug_str'):
+                m = elf_file.search_section(section_name, boost_version_macro_re)
+                if m:
+                    return True, unpack_boost_version(int(m.group(1)))
+            for section_name in ('.debug_str', '.debug_line_str', '.debug_line'):
+                if elf_file.search_section(section_name, boost_marker_re):
+                    return True, None
+        except ValueError:
+            # a section we cannot read might well mention boost
+            return True, None
+        # without .debug_str, names are inlined in .debug_info, which is not searched
+        return elf_file.get_section('.debug_str') is None, None
+
+
+def get_cache_file():
+    """Path of the file caching detected boost versions"""
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'boost-pretty-printer', 'boost-version.json')
+
+
+def read_cache():
+    """Read the boost version cache, as a dict from cache key to version tuple"""
+    try:
+        with open(get_cache_file(), 'r', encoding='utf-8') as cache_file:
+            return dict((key, tuple(version)) for key, version in json.load(cache_file).items())
+    except (IOError, OSError, ValueError, TypeError, AttributeError):
+        return {}
+
+
+def write_cache(cache):
+    """Write the boost version cache, ignoring failures"""
+    cache_file_name = get_cache_file()
+    tmp_file_name = cache_file_name + '.' + str(os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file_name)):
+            os.makedirs(os.path.dirname(cache_file_name))
+        with open(tmp_file_name, 'w', encoding='utf-8') as cache_file:
+            cache_file.write('%s' % json.dumps(cache, sort_keys=True, indent=1))
+        os.rename(tmp_file_name, cache_file_name)
+    except (IOError, OSError):
+        pass
+
+
+def compile_boost_version(cxx, cppflags):
+    """Compile and run simple boost program printing BOOST_VERSION"""
     dir = tempfile.mkdtemp(prefix='boost-printer-autodetect')
     try:
         src = os.path.join(dir, 'version.cpp')
@@ -42,8 +151,6 @@ def detect_boost_version():
         with open(src, 'w', encoding='utf-8') as src_file:
             print(cpp_template, file=src_file)
 
-        cxx = os.environ.get('CXX', 'c++')
-        cppflags = os.environ.get('CPPFLAGS', "")
         cxx_command_line = [cxx] + shlex.split(cppflags) + ['-o', bin, src]
         subprocess.check_call(cxx_command_line)
 
@@ -52,3 +159,42 @@ def detect_boost_version():
         return unpack_boost_version(boost_version_raw)
     finally:
         shutil.rmtree(dir, ignore_errors=True)
+
+
+def detect_boost_version(use_cache=True, method='auto'):
+    """Automatically detect boost version
+
+    With method 'header', find boost/version.hpp in the include directories of CPPFLAGS
+    and the system ones, and parse BOOST_VERSION from it. No compiler is needed.
+
+    With method 'compile', compile and run a simple boost program. The result is cached
+    on disk (see get_cache_file()), keyed by CXX, CPPFLAGS and the path and modification
+    time of boost/version.hpp, so the compiler only runs when one of those changes.
+
+    Method 'auto' tries 'header' first, and falls back to 'compile' if the header
+    cannot be found or parsed.
+
+    :param use_cache: if False, ignore cached versions (the new result is still cached)
+    :param method: 'auto', 'header' or 'compile'
+    """
+    assert method in ('auto', 'header', 'compile')
+    cxx = os.environ.get('CXX', 'c++')
+    cppflags = os.environ.get('CPPFLAGS', '')
+    header = find_boost_version_header(cppflags)
+    if method != 'compile':
+        boost_version = read_boost_version_header(header) if header else None
+        if boost_version is not None:
+            return boost_version
+        if method == 'header':
+            raise RuntimeError('cannot find BOOST_VERSION in boost/version.hpp; set CPPFLAGS=-I<boost include dir>')
+
+    mtime = os.path.getmtime(header) if header else None
+    key = json.dumps([cxx, cppflags, header, mtime])
+
+    cache = read_cache()
+    if use_cache and key in cache:
+        return cache[key]
+    boost_version = compile_boost_version(cxx, cppflags)
+    cache[key] = boost_version
+    write_cache(cache)
+    return boost_version
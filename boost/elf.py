@@ -0,0 +1,210 @@
+# coding: utf-8
+
+"""Minimal ELF reader, enough to get at the (possibly compressed) sections of an object file,
+and at the memory segments and mapped files of a core file"""
+
+from __future__ import print_function, unicode_literals, absolute_import, division
+import mmap
+import os
+import struct
+import zlib
+from io import open
+
+SHT_NOBITS = 8
+SHF_COMPRESSED = 0x800
+ELFCOMPRESS_ZLIB = 1
+SHN_XINDEX = 0xffff
+PN_XNUM = 0xffff
+PT_LOAD = 1
+PT_NOTE = 4
+NT_FILE = 0x46494c45
+
+
+def _decode_filename(name):
+    # python 2 takes file names as bytes
+    return os.fsdecode(name) if hasattr(os, 'fsdecode') else name
+
+
+class Elf_Section(object):
+    """Header of an ELF section"""
+    def __init__(self, name, type, flags, addr, offset, size):
+        self.name = name
+        self.type = type
+        self.flags = flags
+        self.addr = addr
+        self.offset = offset
+        self.size = size
+
+
+class Elf_Segment(object):
+    """Program header of an ELF segment"""
+    def __init__(self, type, offset, vaddr, filesz, memsz):
+        self.type = type
+        self.offset = offset
+        self.vaddr = vaddr
+        self.filesz = filesz
+        self.memsz = memsz
+
+
+class Elf_File(object):
+    """Read-only view of an ELF file, mapped in memory
+
+    Raises ValueError if the file is not an ELF file.
+    """
+    def __init__(self, filename):
+        with open(filename, 'rb') as elf_file:
+            self.data = mmap.mmap(elf_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+            self.sections = self._read_sections()
+            self.segments = self._read_segments()
+        except (struct.error, IndexError):
+            self.close()
+            raise ValueError('truncated ELF file: ' + filename)
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read_header(self):
+        if self.data[:4] != b'\x7fELF':
+            self.close()
+            raise ValueError('not an ELF file')
+        ei_class, ei_data = struct.unpack_from('BB', self.data, 4)
+        self.is_64 = ei_class == 2
+        self.endian = '<' if ei_data == 1 else '>'
+        if self.is_64:
+            (self.phoff, self.shoff) = struct.unpack_from(self.endian + 'QQ', self.data, 0x20)
+            (self.phentsize, self.phnum, self.shentsize, self.shnum, self.shstrndx) = \
+                struct.unpack_from(self.endian + 'HHHHH', self.data, 0x36)
+        else:
+            (self.phoff, self.shoff) = struct.unpack_from(self.endian + 'II', self.data, 0x1c)
+            (self.phentsize, self.phnum, self.shentsize, self.shnum, self.shstrndx) = \
+                struct.unpack_from(self.endian + 'HHHHH', self.data, 0x2a)
+
+    def _read_section_header(self, idx):
+        fmt = 'IIQQQQIIQQ' if self.is_64 else 'IIIIIIIIII'
+        return struct.unpack_from(self.endian + fmt, self.data, self.shoff + idx * self.shentsize)
+
+    def _read_sections(self):
+        if self.shoff == 0:
+            return []
+        shnum, shstrndx = self.shnum, self.shstrndx
+        if shnum == 0 or shstrndx == SHN_XINDEX:
+            # extended numbering: the real values live in section header 0
+            header_0 = self._read_section_header(0)
+            shnum = shnum or header_0[5]
+            if shstrndx == SHN_XINDEX:
+                shstrndx = header_0[6]
+        headers = [self._read_section_header(idx) for idx in range(shnum)]
+        strtab_offset = headers[shstrndx][4]
+        sections = []
+        for (sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size) in (h[:6] for h in headers):
+            end = self.data.find(b'\0', strtab_offset + sh_name)
+            name = self.data[strtab_offset + sh_name:end].decode('utf-8', 'replace')
+            sections.append(Elf_Section(name, sh_type, sh_flags, sh_addr, sh_offset, sh_size))
+        return sections
+
+    def _read_segments(self):
+        if self.phoff == 0:
+            return []
+        phnum = self.phnum
+        if phnum == PN_XNUM and self.shoff != 0:
+            # extended numbering: the real value is sh_info of section header 0
+            phnum = self._read_section_header(0)[7]
+        segments = []
+        for idx in range(phnum):
+            offset = self.phoff + idx * self.phentsize
+            if self.is_64:
+                (p_type, _, p_offset, p_vaddr, _, p_filesz, p_memsz) = \
+                    struct.unpack_from(self.endian + 'IIQQQQQ', self.data, offset)
+            else:
+                (p_type, p_offset, p_vaddr, _, p_filesz, p_memsz) = \
+                    struct.unpack_from(self.endian + 'IIIIII', self.data, offset)
+            segments.append(Elf_Segment(p_type, p_offset, p_vaddr, p_filesz, p_memsz))
+        return segments
+
+    def notes(self):
+        """Generate the (name, type, descriptor) of the notes in the PT_NOTE segments"""
+        for segment in self.segments:
+            if segment.type != PT_NOTE:
+                continue
+            offset, end = segment.offset, segment.offset + segment.filesz
+            while offset + 12 <= end:
+                namesz, descsz, note_type = struct.unpack_from(self.endian + 'III', self.data, offset)
+                offset += 12
+                name = self.data[offset:offset + namesz].rstrip(b'\0').decode('utf-8', 'replace')
+                offset += (namesz + 3) & ~3
+                desc = self.data[offset:offset + descsz]
+                offset += (descsz + 3) & ~3
+                yield name, note_type, desc
+
+    def file_mappings(self):
+        """Get the files mapped in the memory of a core file, as (start, end, file offset, filename) tuples"""
+        word = 'Q' if self.is_64 else 'I'
+        word_size = struct.calcsize(word)
+        for name, note_type, desc in self.notes():
+            if name != 'CORE' or note_type != NT_FILE:
+                continue
+            count, page_size = struct.unpack_from(self.endian + word + word, desc, 0)
+            entries = struct.unpack_from(self.endian + word * (3 * count), desc, 2 * word_size)
+            filenames = desc[(2 + 3 * count) * word_size:].split(b'\0')
+            return [(entries[3 * i], entries[3 * i + 1], entries[3 * i + 2] * page_size,
+                     _decode_filename(filenames[i]))
+                    for i in range(count)]
+        return []
+
+    def get_section(self, name):
+        """Get the section called `name` (or its legacy .zdebug form), or None"""
+        for section in self.sections:
+            if section.name == name or (name.startswith('.debug') and section.name == '.z' + name[1:]):
+                return section
+        return None
+
+    def search_section(self, name, regex, chunk_size=1 << 20, overlap=256):
+        """Search the contents of section `name` for the compiled bytes regular expression `regex`
+
+        Uncompressed sections are searched in place, in the mapped file. Compressed sections
+        are decompressed one chunk at a time, so matches must be shorter than `overlap` bytes.
+        Lookbehind assertions do not see past the start of the section.
+
+        :return: the first match, or None if there is no match or no such section
+        :raise ValueError: if the section is compressed in a format zlib cannot decompress
+        """
+        section = self.get_section(name)
+        if section is None or section.type == SHT_NOBITS:
+            return None
+        start, end = section.offset, section.offset + section.size
+        if section.flags & SHF_COMPRESSED:
+            # Elf64_Chdr is 24 bytes, Elf32_Chdr 12; both start with ch_type
+            ch_type = struct.unpack_from(self.endian + 'I', self.data, start)[0]
+            if ch_type != ELFCOMPRESS_ZLIB:
+                # e.g. zstd, which the standard library cannot decompress
+                raise ValueError('unsupported compression of section ' + section.name)
+            start += 24 if self.is_64 else 12
+        elif section.name.startswith('.zdebug') and self.data[start:start + 4] == b'ZLIB':
+            start += 12
+        else:
+            if start > 0 and self.data[start - 1:start] != b'\0':
+                # in place, lookbehind assertions would see the end of the previous section
+                m = regex.search(self.data[start:min(start + overlap, end)])
+                if m:
+                    return m
+            return regex.search(self.data, start, end)
+        decompressor = zlib.decompressobj()
+        tail = b''
+        for offset in range(start, end, chunk_size):
+            try:
+                data = tail + decompressor.decompress(self.data[offset:min(offset + chunk_size, end)])
+            except zlib.error:
+                raise ValueError('corrupt compressed section ' + section.name)
+            m = regex.search(data)
+            if m:
+                return m
+            tail = data[-overlap:]
+        return None
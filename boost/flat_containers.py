@@ -27,7 +27,38 @@
 from .utils import *
 
 
-class FlatSetBase:
+class FlatContainerBase:
+    """
+    Common part of flat_set and flat_map printers.
+
+    Subclasses define get_holder(), returning the holder of the vector of elements.
+    It is looked up once per printer, then the elements are read in bulk when possible.
+    """
+    @lazy_attribute
+    def holder(self):
+        return self.get_holder()
+
+    @lazy_attribute
+    def start(self):
+        return self.holder["m_start"]
+
+    def get_pointer(self):
+        return self.start
+
+    def get_size(self):
+        return int(self.holder["m_size"])
+
+    def get_capacity(self):
+        return int(self.holder["m_capacity"])
+
+    def get_element(self, idx):
+        return (self.start + idx).dereference()
+
+    def elements(self):
+        return contiguous_values(self.start, self.get_size())
+
+
+class FlatSetBase(FlatContainerBase):
     """Pretty Printer for boost::container::flat_set"""
     printer_name = 'boost::container::flat_set'
     template_name = 'boost::container::flat_set'
@@ -41,14 +72,14 @@ class FlatSetBase:
             self.element_type, self.get_size(), self.get_capacity())
 
     def children(self):
-        for idx in xrange(self.get_size()):
-            yield '[{}]'.format(idx), (self.get_pointer() + idx).dereference()
+        for idx, element in enumerate(self.elements()):
+            yield '[{}]'.format(idx), element
 
     def display_hint(self):
         return 'array'
 
 
-class FlatMapBase:
+class FlatMapBase(FlatContainerBase):
     """Pretty Printer for boost::container::flat_map"""
     printer_name = 'boost::container::flat_map'
     template_name = 'boost::container::flat_map'
@@ -63,8 +94,7 @@ class FlatMapBase:
             self.key_type, self.value_type, self.get_size(), self.get_capacity())
 
     def children(self):
-        for idx in xrange(self.get_size()):
-            pair = (self.get_pointer() + idx).dereference()
+        for idx, pair in enumerate(self.elements()):
             yield '[{}]'.format(idx), pair["first"]
             yield '[{}]'.format(idx), pair["second"]
 
@@ -73,36 +103,18 @@ class FlatMapBase:
 
 
 class FlatTree152:
-    def get_pointer(self):
-        return self.val["m_flat_tree"]["m_data"]["m_vect"]["members_"]["m_start"]
-
-    def get_size(self):
-        return int(self.val["m_flat_tree"]["m_data"]["m_vect"]["members_"]["m_size"])
-
-    def get_capacity(self):
-        return int(self.val["m_flat_tree"]["m_data"]["m_vect"]["members_"]["m_capacity"])
+    def get_holder(self):
+        return self.val["m_flat_tree"]["m_data"]["m_vect"]["members_"]
 
 
 class FlatTree154:
-    def get_pointer(self):
-        return self.val["m_flat_tree"]["m_data"]["m_vect"]["m_holder"]["m_start"]
-
-    def get_size(self):
-        return int(self.val["m_flat_tree"]["m_data"]["m_vect"]["m_holder"]["m_size"])
-
-    def get_capacity(self):
-        return int(self.val["m_flat_tree"]["m_data"]["m_vect"]["m_holder"]["m_capacity"])
+    def get_holder(self):
+        return self.val["m_flat_tree"]["m_data"]["m_vect"]["m_holder"]
 
 
 class FlatTree158:
-    def get_pointer(self):
-        return self.val["m_data"]["m_vect"]["m_holder"]["m_start"]
-
-    def get_size(self):
-        return int(self.val["m_data"]["m_vect"]["m_holder"]["m_size"])
-
-    def get_capacity(self):
-        return int(self.val["m_data"]["m_vect"]["m_holder"]["m_capacity"])
+    def get_holder(self):
+        return self.val["m_data"]["m_vect"]["m_holder"]
 
 
 @add_printer
@@ -140,14 +152,8 @@ class FlatSet165Printer(FlatSetBase):
     def __init__(self, value):
         FlatSetBase.__init__(self, value)
 
-    def get_pointer(self):
-        return self.val["m_data"]["m_seq"]["m_holder"]["m_start"]
-
-    def get_size(self):
-        return int(self.val["m_data"]["m_seq"]["m_holder"]["m_size"])
-
-    def get_capacity(self):
-        return int(self.val["m_data"]["m_seq"]["m_holder"]["m_capacity"])
+    def get_holder(self):
+        return self.val["m_data"]["m_seq"]["m_holder"]
 
 
 @add_printer
@@ -176,14 +182,8 @@ class FlatMap165Printer(FlatMapBase):
     def __init__(self, value):
         FlatMapBase.__init__(self, value)
 
-    def get_pointer(self):
-        return self.val["m_flat_tree"]["m_data"]["m_seq"]["m_holder"]["m_start"]
-
-    def get_size(self):
-        return int(self.val["m_flat_tree"]["m_data"]["m_seq"]["m_holder"]["m_size"])
-
-    def get_capacity(self):
-        return int(self.val["m_flat_tree"]["m_data"]["m_seq"]["m_holder"]["m_capacity"])
+    def get_holder(self):
+        return self.val["m_flat_tree"]["m_data"]["m_seq"]["m_holder"]
 
 
 # Iterator used for flat_set/flat_map
@@ -0,0 +1,171 @@
+# encoding: utf-8
+
+#
+# Key lookup in flat containers: $boost_flat_find(container, key) and boost-find-key
+#
+# flat_set and flat_map keep their elements sorted by key in a vector, so a key is found
+# by bisection, reading only the O(log n) keys probed instead of printing everything or
+# calling the (usually inlined) find() in the inferior. Keys are compared in python, which
+# needs the comparison of the container to be std::less. How keys compare is chosen from
+# the key type of the container, like std::less does: numbers, enums and pointers compare
+# as numbers (so const char* keys compare by address), char arrays and types whose printer
+# prints a string, such as std::string, compare as strings, byte by byte like
+# std::char_traits<char>::compare. The key looked up may then be a C string.
+#
+
+from __future__ import print_function, absolute_import, division
+import gdb
+from .utils import *
+
+flat_key_getters = {
+    'boost::container::flat_set': lambda element: element,
+    'boost::container::flat_map': lambda element: element['first'],
+}
+number_type_codes = [gdb.TYPE_CODE_INT, gdb.TYPE_CODE_ENUM, gdb.TYPE_CODE_PTR, gdb.TYPE_CODE_CHAR,
+                     gdb.TYPE_CODE_BOOL]
+
+
+def is_char_type(t):
+    t = get_basic_type(t)
+    return t.code in [gdb.TYPE_CODE_INT, gdb.TYPE_CODE_CHAR] and t.sizeof == 1
+
+
+def number_key(v):
+    """Convert number, enum or pointer `v` into a python number that compares like it"""
+    t = get_basic_type(v.type)
+    if t.code == gdb.TYPE_CODE_FLT:
+        return float(v)
+    if t.code not in number_type_codes:
+        raise gdb.GdbError('cannot compare a key of type {} with numbers or pointers'.format(v.type))
+    return intptr(v)
+
+
+def string_key(v):
+    """
+    Convert `v` into a python string that compares like it: `v` is a char array or pointer,
+    or a value whose printer prints a string.
+    """
+    t = get_basic_type(v.type)
+    if t.code in [gdb.TYPE_CODE_ARRAY, gdb.TYPE_CODE_PTR] and is_char_type(t.target()):
+        if t.code == gdb.TYPE_CODE_PTR and intptr(v) == 0:
+            raise gdb.GdbError('cannot compare a null string key')
+        # latin-1 maps bytes to code points of the same order
+        return v.string('latin-1')
+    printer = gdb.default_visualizer(v)
+    if printer is not None and hasattr(printer, 'to_string'):
+        s = printer.to_string()
+        if isinstance(s, gdb.LazyString):
+            return s.value().string('latin-1', length=s.length)
+        if isinstance(s, gdb.Value):
+            return string_key(s)
+        hint = printer.display_hint() if hasattr(printer, 'display_hint') else None
+        if s is not None and hint == 'string':
+            return str(s)
+    raise gdb.GdbError('cannot compare a key of type {} with strings'.format(v.type))
+
+
+def key_converter(key_type):
+    """
+    Get the function converting keys into python objects that compare like keys of type
+    `key_type` with std::less.
+
+    Raises:
+      gdb.GdbError, if keys of that type cannot be compared in python.
+    """
+    t = get_basic_type(key_type)
+    if t.code in number_type_codes or t.code == gdb.TYPE_CODE_FLT:
+        return number_key
+    if t.code == gdb.TYPE_CODE_ARRAY and is_char_type(t.target()):
+        return string_key
+    if t.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION]:
+        # string_key() checks that the printer prints a string
+        return string_key
+    raise gdb.GdbError('cannot compare keys of type: ' + str(key_type))
+
+
+def get_flat_printer(container):
+    """
+    Get the printer of flat_set or flat_map `container`.
+
+    Raises:
+      gdb.GdbError, if `container` is not a flat container sorted with std::less.
+    """
+    printer = get_printer(container)
+    if printer.printer_name not in flat_key_getters:
+        raise gdb.GdbError('not a flat_set or flat_map: ' + str(container.type))
+    t = get_basic_type(container.type)
+    compare = t.template_argument(1 if printer.printer_name == 'boost::container::flat_set' else 2)
+    if template_name(compare) != 'std::less':
+        raise gdb.GdbError('cannot search a flat container sorted with: ' + str(compare))
+    return printer
+
+
+def flat_find(printer, key):
+    """
+    Binary search for gdb.Value `key` in the flat container of `printer`.
+
+    Returns the index and the element with that key, or None if there is none.
+    """
+    get_key = flat_key_getters[printer.printer_name]
+    convert = key_converter(get_basic_type(printer.val.type).template_argument(0))
+    key = convert(key)
+    lo, hi = 0, printer.get_size()
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if convert(get_key(printer.get_element(mid))) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < printer.get_size():
+        element = printer.get_element(lo)
+        if convert(get_key(element)) == key:
+            return lo, element
+    return None
+
+
+class Flat_Find_Function(gdb.Function):
+    """
+    Find a key in a boost flat_set or flat_map by binary search.
+
+    Usage: $boost_flat_find(CONTAINER, KEY)
+    Returns the element with key KEY (a pair, for maps); it is an error if there is none.
+    """
+
+    def __init__(self):
+        super(Flat_Find_Function, self).__init__('boost_flat_find')
+
+    def invoke(self, container, key):
+        found = flat_find(get_flat_printer(container), key)
+        if found is None:
+            raise gdb.GdbError('key not found')
+        return found[1]
+
+
+Flat_Find_Function()
+
+
+class Find_Key_Command(gdb.Command):
+    """
+    Find a key in a boost flat_set or flat_map by binary search, and print its element.
+
+    Usage: boost-find-key CONTAINER KEY
+    Separate CONTAINER and KEY with a comma if CONTAINER contains spaces.
+    """
+
+    def __init__(self):
+        super(Find_Key_Command, self).__init__('boost-find-key', gdb.COMMAND_DATA, gdb.COMPLETE_EXPRESSION)
+
+    def invoke(self, arg, from_tty):
+        args = split_expressions(arg)
+        if len(args) == 1:
+            args = args[0].split(None, 1)
+        if len(args) != 2:
+            raise gdb.GdbError('usage: boost-find-key CONTAINER KEY')
+        found = flat_find(get_flat_printer(gdb.parse_and_eval(args[0])), gdb.parse_and_eval(args[1]))
+        if found is None:
+            gdb.write('key not found\n')
+        else:
+            gdb.write('[{}] = {}\n'.format(*found))
+
+
+Find_Key_Command()
@@ -87,14 +87,14 @@ def f(vtt):
 # resolve trivial_value_traits::to_value_ptr
 #   node == value
 #
-@add_to_dict(static_method, ('boost::intrusive::trivial_value_traits', 'to_value_ptr'))
+@add_to_dict(static_method, ('boost::intrusive::trivial_value_traits', 'to_value_ptr'), builtin=True)
 def f(vtt, node_rptr):
     return node_rptr
 
 # resolve bhtraits::to_value_ptr
 #   perform a 2-step upcast to accomodate for multiple base hooks
 #
-@add_to_dict(static_method, ('boost::intrusive::bhtraits', 'to_value_ptr'))
+@add_to_dict(static_method, ('boost::intrusive::bhtraits', 'to_value_ptr'), builtin=True)
 def f(vtt, node_rptr):
     def get_hook_type(value_t, tag_t):
         """Get a base hook type of a type value_t corresponding to a type tag_t"""
@@ -120,7 +120,7 @@ def f(vtt, node_rptr):
 # resolve mhtraits::to_value_ptr
 #   offset is 3rd template argument
 #
-@add_to_dict(static_method, ('boost::intrusive::mhtraits', 'to_value_ptr'))
+@add_to_dict(static_method, ('boost::intrusive::mhtraits', 'to_value_ptr'), builtin=True)
 def f(vtt, node_rptr):
     offset = vtt.template_argument(2)
     offset_int = parse_and_eval('(size_t)(' + str(offset) + ')')
@@ -135,7 +135,7 @@ def f(vtt, node_rptr):
 #
 @add_to_dict(static_method,
              ('boost::intrusive::list_node_traits', 'get_next'),
-             ('boost::intrusive::slist_node_traits', 'get_next'))
+             ('boost::intrusive::slist_node_traits', 'get_next'), builtin=True)
 def f(ntt, node_rptr):
     return node_rptr['next_']
 
@@ -144,7 +144,7 @@ def f(ntt, node_rptr):
 @add_to_dict(static_method,
              ('boost::intrusive::rbtree_node_traits', 'get_parent'),
              ('boost::intrusive::avltree_node_traits', 'get_parent'),
-             ('boost::intrusive::tree_node_traits', 'get_parent'))
+             ('boost::intrusive::tree_node_traits', 'get_parent'), builtin=True)
 def f(ntt, node_rptr):
     return node_rptr['parent_']
 
@@ -153,7 +153,7 @@ def f(ntt, node_rptr):
 @add_to_dict(static_method,
              ('boost::intrusive::rbtree_node_traits', 'get_left'),
              ('boost::intrusive::avltree_node_traits', 'get_left'),
-             ('boost::intrusive::tree_node_traits', 'get_left'))
+             ('boost::intrusive::tree_node_traits', 'get_left'), builtin=True)
 def f(ntt, node_rptr):
     return node_rptr['left_']
 
@@ -162,11 +162,134 @@ def f(ntt, node_rptr):
 @add_to_dict(static_method,
              ('boost::intrusive::rbtree_node_traits', 'get_right'),
              ('boost::intrusive::avltree_node_traits', 'get_right'),
-             ('boost::intrusive::tree_node_traits', 'get_right'))
+             ('boost::intrusive::tree_node_traits', 'get_right'), builtin=True)
 def f(ntt, node_rptr):
     return node_rptr['right_']
 
 
+class Static_Method_Steps(object):
+    """
+    Traversal steps of a (value_traits, node_traits) pair, done with static method calls.
+
+    Nodes are gdb.Value raw pointers.
+    """
+    def __init__(self, value_traits_t, node_traits_t, optimize_size=False):
+        self.value_traits_t = value_traits_t
+        self.node_traits_t = node_traits_t
+        self.optimize_size = optimize_size
+
+    def node(self, node_rptr):
+        return node_rptr
+
+    def is_null(self, node):
+        return is_null(node)
+
+    def value_ptr(self, node):
+        return get_raw_ptr(call_static_method(self.value_traits_t, 'to_value_ptr', node))
+
+    def link(self, node, f):
+        n = get_raw_ptr(call_static_method(self.node_traits_t, f, node))
+        if f == 'get_parent' and self.optimize_size:
+            # the 2 low bits of the parent pointer hold the color/balance
+            n = parse_and_eval('(' + str(get_basic_type(n.type)) + ')(((size_t)' + str(n).split()[0] + ') & (~(size_t)3))')
+        return n
+
+
+class Offset_Steps(object):
+    """
+    Traversal steps of a (value_traits, node_traits) pair, done with address arithmetic.
+
+    Nodes are addresses (int). The builtin bypasses only add constant offsets and read
+    pointer fields, so they are probed once with a sentinel node address to find:
+    the offset from node to value, and the offset and size of each node link.
+    """
+    sentinel = 0x10000000
+
+    def __init__(self, value_traits_t, node_traits_t, node_rptr_t, links, optimize_size=False):
+        sentinel_node = gdb.Value(self.sentinel).cast(node_rptr_t)
+        value_rptr = get_raw_ptr(get_builtin_static_method(value_traits_t, 'to_value_ptr')(value_traits_t, sentinel_node))
+        self.value_rptr_t = value_rptr.type
+        self.value_offset = self.sentinel - intptr(value_rptr)
+        self.links = dict()
+        for f in links:
+            field = get_builtin_static_method(node_traits_t, f)(node_traits_t, sentinel_node)
+            assert field.type.strip_typedefs().code == gdb.TYPE_CODE_PTR, 'node link is not a raw pointer'
+            self.links[f] = (intptr(field.address) - self.sentinel, field.type.sizeof)
+        self.parent_mask = ~3 if optimize_size else ~0
+
+    def node(self, node_rptr):
+        return intptr(node_rptr)
+
+    def is_null(self, node):
+        return node == 0
+
+    def value_ptr(self, node):
+        return gdb.Value(node - self.value_offset).cast(self.value_rptr_t)
+
+    def link(self, node, f):
+        offset, size = self.links[f]
+        n = read_pointer(node + offset, size)
+        if f == 'get_parent':
+            n &= self.parent_mask
+        return n
+
+
+def get_builtin_static_method(t, f):
+    """
+    Get the builtin bypass that call_static_method() would use for `t`::`f`, or None.
+
+    Bypasses added or replaced by the user are never compiled into a traversal plan.
+    """
+    facts = type_facts(t)
+    if (facts.stripped_name, f) in static_method:
+        return None
+    if not is_builtin_bypass(static_method, (facts.template_name, f)):
+        return None
+    return static_method[(facts.template_name, f)]
+
+
+def uses_builtin_static_methods(value_traits_t, node_traits_t, links):
+    """
+    Check if the bypasses of a traversal with the given traits and `links` are all builtin.
+    """
+    return (get_builtin_static_method(value_traits_t, 'to_value_ptr') is not None
+            and all(get_builtin_static_method(node_traits_t, f) is not None for f in links))
+
+
+_offset_steps = Type_Cache()
+
+
+def get_traversal_steps(value_traits_t, node_traits_t, node_rptr, links, optimize_size=False):
+    """
+    Get the traversal steps for containers with the given traits and node pointer `node_rptr`.
+
+    Offset_Steps are compiled once per traits pair and node pointer type, when all the bypasses
+    needed are builtin and nodes are linked by raw pointers; otherwise, Static_Method_Steps.
+    The bypasses are checked again on every call, since the user may add some at any time.
+    """
+    key = (type_key(value_traits_t), type_key(node_traits_t), type_key(node_rptr.type), tuple(links), optimize_size)
+    if None in key[:3]:
+        steps = None
+    elif key in _offset_steps:
+        steps = _offset_steps[key]
+        if steps is not None and not uses_builtin_static_methods(value_traits_t, node_traits_t, links):
+            # compiled again if the user bypasses are removed
+            del _offset_steps[key]
+            steps = None
+    else:
+        steps = None
+        if (node_rptr.type.strip_typedefs().code == gdb.TYPE_CODE_PTR
+                and uses_builtin_static_methods(value_traits_t, node_traits_t, links)):
+            try:
+                steps = Offset_Steps(value_traits_t, node_traits_t, node_rptr.type, links, optimize_size)
+            except (gdb.error, AssertionError):
+                steps = None
+        _offset_steps[key] = steps
+    if steps is None:
+        steps = Static_Method_Steps(value_traits_t, node_traits_t, optimize_size)
+    return steps
+
+
 @add_printer
 class Iterator_Printer:
     """Pretty Printer for boost::intrusive::(list|slist|tree)_iterator"""
@@ -202,25 +325,24 @@ class List_Printer:
         def __init__(self, v):
             self.value_traits_t = v.value_traits_t
             self.node_traits_t = v.node_traits_t
-            self.root_node_rptr = get_raw_ptr(call_object_method(v, 'get_root_node'))
+            root_node_rptr = get_raw_ptr(call_object_method(v, 'get_root_node'))
+            self.steps = get_traversal_steps(self.value_traits_t, self.node_traits_t, root_node_rptr, ['get_next'])
+            self.root_node = self.steps.node(root_node_rptr)
 
         def __iter__(self):
             self.count = 0
-            self.crt_node_rptr = get_raw_ptr(call_static_method(
-                self.node_traits_t, 'get_next', self.root_node_rptr))
+            self.crt_node = self.steps.link(self.root_node, 'get_next')
             return self
 
         def __next__(self):
-            if self.crt_node_rptr == self.root_node_rptr or is_null(self.crt_node_rptr):
+            if self.crt_node == self.root_node or self.steps.is_null(self.crt_node):
                 raise StopIteration
-            val_rptr = get_raw_ptr(call_static_method(
-                self.value_traits_t, 'to_value_ptr', self.crt_node_rptr))
+            val_rptr = self.steps.value_ptr(self.crt_node)
             index_str = '[%d @%s]' % (self.count, print_ptr(val_rptr))
             result = index_str, val_rptr.referenced_value()
 
             self.count += 1
-            self.crt_node_rptr = get_raw_ptr(call_static_method(
-                self.node_traits_t, 'get_next', self.crt_node_rptr))
+            self.crt_node = self.steps.link(self.crt_node, 'get_next')
             return result
 
         def next(self):
@@ -249,6 +371,8 @@ class Tree_Printer:
     printer_name = 'boost::intrusive::set'
     min_supported_version = (1, 55, 0)
     max_supported_version = (1, 69, 0)
+    template_namespace = 'boost::intrusive'
+    supports_type_only = True
 
     @staticmethod
     def get_bstree_impl_base(t):
@@ -279,23 +403,24 @@ class Tree_Printer:
         def __init__(self, v):
             self.value_traits_t = v.value_traits_t
             self.node_traits_t = v.node_traits_t
-            self.optimize_size = False
+            optimize_size = False
             if template_name(self.node_traits_t) in ['boost::intrusive::avltree_node_traits',
                                                      'boost::intrusive::rbtree_node_traits']:
-                self.optimize_size = bool(self.node_traits_t.template_argument(1))
-            self.header_node_rptr = get_raw_ptr(call_object_method(v.cast(v.bstree_impl_t), 'header_ptr'))
+                optimize_size = bool(self.node_traits_t.template_argument(1))
+            header_node_rptr = get_raw_ptr(call_object_method(v.cast(v.bstree_impl_t), 'header_ptr'))
+            self.steps = get_traversal_steps(self.value_traits_t, self.node_traits_t, header_node_rptr,
+                                             ['get_left', 'get_right', 'get_parent'], optimize_size)
+            self.header_node = self.steps.node(header_node_rptr)
 
         def __iter__(self):
             self.count = 0
-            self.crt_node_rptr = get_raw_ptr(call_static_method(
-                self.node_traits_t, 'get_left', self.header_node_rptr))
+            self.crt_node = self.steps.link(self.header_node, 'get_left')
             return self
 
         def __next__(self):
-            if self.crt_node_rptr == self.header_node_rptr:
+            if self.crt_node == self.header_node:
                 raise StopIteration
-            val_rptr = get_raw_ptr(call_static_method(
-                self.value_traits_t, 'to_value_ptr', self.crt_node_rptr))
+            val_rptr = self.steps.value_ptr(self.crt_node)
             index_str = '[%d @%s]' % (self.count, print_ptr(val_rptr))
             result = index_str, val_rptr.referenced_value()
             self.count += 1
@@ -306,26 +431,23 @@ class Tree_Printer:
             return self.__next__()
 
         def advance(self):
-            n = get_raw_ptr(call_static_method(
-                self.node_traits_t, 'get_right', self.crt_node_rptr))
-            if not is_null(n):
+            n = self.steps.link(self.crt_node, 'get_right')
+            if not self.steps.is_null(n):
                 # if right subtree is not empty, find leftmost node in it
-                self.crt_node_rptr = n
+                self.crt_node = n
                 while True:
-                    n = get_raw_ptr(call_static_method(self.node_traits_t, 'get_left', self.crt_node_rptr))
-                    if is_null(n):
+                    n = self.steps.link(self.crt_node, 'get_left')
+                    if self.steps.is_null(n):
                         break
-                    self.crt_node_rptr = n
+                    self.crt_node = n
             else:
                 # if right subtree is empty, find first ancestor in whose left subtree we are
                 while True:
-                    old_n = self.crt_node_rptr
-                    self.crt_node_rptr = get_raw_ptr(call_static_method(self.node_traits_t, 'get_parent', self.crt_node_rptr))
-                    if self.optimize_size:
-                        self.crt_node_rptr = parse_and_eval('(' + str(get_basic_type(self.crt_node_rptr.type)) + ')(((size_t)' + str(self.crt_node_rptr).split()[0] + ') & (~(size_t)3))')
-                    if self.crt_node_rptr == self.header_node_rptr:
+                    old_n = self.crt_node
+                    self.crt_node = self.steps.link(self.crt_node, 'get_parent')
+                    if self.crt_node == self.header_node:
                         break
-                    n = get_raw_ptr(call_static_method(self.node_traits_t, 'get_left', self.crt_node_rptr))
+                    n = self.steps.link(self.crt_node, 'get_left')
                     if n == old_n:
                         break
 
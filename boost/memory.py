@@ -0,0 +1,576 @@
+# coding: utf-8
+
+"""Reading inferior memory: read-through page cache, and direct reads of live local inferiors and core files"""
+
+from __future__ import print_function, absolute_import, division
+import bisect
+import collections
+import mmap
+import os
+import re
+import gdb
+from .elf import Elf_File, PT_LOAD
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, offset)
+    # python 2
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def inferior_key(inferior):
+    """
+    Identify the process of `inferior` and the target it is on.
+
+    A pid alone does not tell apart a live process from its core file, or two core files
+    (e.g. of containers, where pids are often 1): each of these is a new connection.
+    """
+    # gdb < 11 has no connection numbers; the event handlers below cover these
+    return (inferior.num, inferior.pid, getattr(inferior, 'connection_num', None))
+
+
+class Proc_Mem_Reader(object):
+    """
+    Reader of the memory of a live inferior running on this machine, through /proc/<pid>/mem.
+
+    This bypasses gdb, so it is only used when gdb says the inferior is on the native target
+    (which excludes remote targets and core files) and /proc/<pid>/exe is the inferior program.
+    """
+    def __init__(self):
+        self.enabled = True
+        self.inferior = None
+        self.fd = None
+        self.reads = 0
+        self.bytes_read = 0
+
+    def close(self, event=None):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = None
+        self.inferior = None
+
+    def _usable(self, inferior):
+        connection = getattr(inferior, 'connection', None)
+        if inferior.pid <= 0 or connection is None or connection.type != 'native':
+            # gdb < 11 does not tell which target the inferior is on
+            return False
+        filename = inferior.progspace.filename if inferior.progspace is not None else None
+        try:
+            exe = os.path.realpath('/proc/{}/exe'.format(inferior.pid))
+        except OSError:
+            return False
+        return filename is None or exe == os.path.realpath(filename)
+
+    def _get_fd(self, inferior):
+        key = inferior_key(inferior)
+        if key != self.inferior:
+            self.close()
+            self.inferior = key
+            if self.enabled and self._usable(inferior):
+                try:
+                    self.fd = os.open('/proc/{}/mem'.format(inferior.pid), os.O_RDONLY)
+                except OSError:
+                    self.fd = None
+        return self.fd
+
+    def read(self, inferior, addr, size):
+        """
+        Read `size` bytes at address `addr` of `inferior`, as a memoryview.
+
+        Returns None if the reader cannot be used, or the memory cannot be read.
+        """
+        fd = self._get_fd(inferior)
+        if fd is None:
+            return None
+        chunks = list()
+        done = 0
+        try:
+            while done < size:
+                chunk = _pread(fd, size - done, addr + done)
+                if not chunk:
+                    return None
+                chunks.append(chunk)
+                done += len(chunk)
+        except (OSError, OverflowError):
+            return None
+        self.reads += 1
+        self.bytes_read += size
+        return memoryview(chunks[0] if len(chunks) == 1 else b''.join(chunks))
+
+
+proc_mem_reader = Proc_Mem_Reader()
+
+
+class Core_File_Reader(object):
+    """
+    Reader of the memory of a core file, through a memory map of the core file.
+
+    Memory dumped in the core is read from its PT_LOAD segments. Memory that was not dumped
+    (typically the code and read-only data of the executable and shared libraries) is read
+    from the files it was mapped from, as listed in the NT_FILE note of the core.
+    """
+    def __init__(self):
+        self.enabled = True
+        self.inferior = None
+        self.core = None
+        self.view = None
+        self.files = dict()
+        self.reads = 0
+        self.bytes_read = 0
+
+    def close(self, event=None):
+        if self.core is not None:
+            _release(self.view)
+            for mapped_file in self.files.values():
+                _release(mapped_file)
+            try:
+                self.core.close()
+            except BufferError:
+                # a memoryview of it is still in use; it is unmapped when collected
+                pass
+        self.core = None
+        self.view = None
+        self.files = dict()
+        self.inferior = None
+
+    @staticmethod
+    def _core_filename(inferior):
+        connection = getattr(inferior, 'connection', None)
+        if connection is not None and connection.type != 'core':
+            return None
+        try:
+            info = gdb.execute('info target', to_string=True)
+        except gdb.error:
+            return None
+        m = re.search(r"core dump file:\s*[`'](.*)', file type", info)
+        return m.group(1) if m else None
+
+    def _load(self, inferior):
+        key = inferior_key(inferior)
+        if key != self.inferior:
+            self.close()
+            self.inferior = key
+            filename = self._core_filename(inferior) if self.enabled else None
+            if filename is not None:
+                try:
+                    core = Elf_File(filename)
+                    mappings = sorted(core.file_mappings())
+                except (IOError, OSError, ValueError):
+                    return None
+                self.core = core
+                self.view = _buffer(core.data)
+                self.segments = sorted((s for s in core.segments if s.type == PT_LOAD), key=lambda s: s.vaddr)
+                self.segment_starts = [s.vaddr for s in self.segments]
+                self.mappings = mappings
+                self.mapping_starts = [m[0] for m in mappings]
+        return self.core
+
+    def _mapped_file(self, filename):
+        if filename not in self.files:
+            try:
+                with open(filename, 'rb') as f:
+                    self.files[filename] = _buffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except (IOError, OSError, ValueError):
+                # e.g. the file is missing on this machine
+                self.files[filename] = None
+        return self.files[filename]
+
+    def _read_mapped_file(self, addr, size):
+        idx = bisect.bisect_right(self.mapping_starts, addr) - 1
+        if idx < 0:
+            return None
+        start, end, file_offset, filename = self.mappings[idx]
+        if addr + size > end:
+            return None
+        data = self._mapped_file(filename)
+        offset = file_offset + addr - start
+        if data is None or offset + size > len(data):
+            return None
+        return data[offset:offset + size]
+
+    def read(self, inferior, addr, size):
+        """
+        Read `size` bytes at address `addr` of `inferior`, as a memoryview.
+
+        Returns None if `inferior` is not a core file, or the memory is not in one segment of it.
+        """
+        if self._load(inferior) is None:
+            return None
+        idx = bisect.bisect_right(self.segment_starts, addr) - 1
+        if idx < 0:
+            return None
+        segment = self.segments[idx]
+        offset = addr - segment.vaddr
+        if offset + size <= segment.filesz:
+            result = self.view[segment.offset + offset:segment.offset + offset + size]
+        elif offset >= segment.filesz and offset + size <= segment.memsz:
+            result = self._read_mapped_file(addr, size)
+        else:
+            result = None
+        if result is None:
+            return None
+        self.reads += 1
+        self.bytes_read += size
+        return memoryview(result)
+
+
+def _buffer(data):
+    # python 2 cannot make a memoryview of a mmap; slices of the mmap are copies then
+    try:
+        return memoryview(data)
+    except TypeError:
+        return data
+
+
+def _release(data):
+    if isinstance(data, memoryview) and hasattr(data, 'release'):
+        try:
+            data.release()
+        except BufferError:
+            pass
+
+
+core_file_reader = Core_File_Reader()
+
+
+def read_memory_direct(inferior, addr, size):
+    """
+    Read `size` bytes at address `addr` of `inferior`, bypassing gdb when possible.
+
+    Raises:
+      gdb.MemoryError, if the memory cannot be read.
+    """
+    result = proc_mem_reader.read(inferior, addr, size)
+    if result is None:
+        result = core_file_reader.read(inferior, addr, size)
+    if result is None:
+        result = inferior.read_memory(addr, size)
+    return memoryview(result)
+
+
+def is_remote_target(inferior):
+    """Whether `inferior` is debugged through the gdb remote protocol, e.g. with gdbserver"""
+    connection = getattr(inferior, 'connection', None)
+    if connection is not None:
+        return connection.type in ['remote', 'extended-remote']
+    # gdb < 11
+    try:
+        return 'remote' in gdb.execute('info target', to_string=True).lower()
+    except gdb.error:
+        return False
+
+
+class Page_Cache(object):
+    """
+    Cache of inferior memory, read in aligned pages of `page_size` bytes.
+
+    At most `max_pages` pages are kept; the least recently used ones are dropped first.
+    The cache must be emptied whenever inferior memory might have changed; this is done
+    by the event handlers connected below.
+
+    On remote targets, where every read is a round trip, a missed page is read together
+    with the other pages of its aligned block of `read_ahead` pages, and the missing pages
+    of a range are read at once (see prefetch()).
+    """
+    def __init__(self, page_size=4096, max_pages=4096, read_ahead=16):
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.read_ahead = read_ahead
+        self.enabled = True
+        self.pages = collections.OrderedDict()
+        self.inferior = None
+        self.remote = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.uncached_reads = 0
+        self.invalidations = 0
+        self.block_reads = 0
+
+    def invalidate(self, event=None):
+        if self.pages:
+            self.invalidations += 1
+        self.pages.clear()
+
+    def _check_inferior(self):
+        inferior = gdb.selected_inferior()
+        key = inferior_key(inferior)
+        if key != self.inferior:
+            self.invalidate()
+            self.inferior = key
+            self.remote = is_remote_target(inferior)
+        return inferior
+
+    def _add_page(self, page_addr, page):
+        if page_addr in self.pages:
+            return
+        if len(self.pages) >= self.max_pages:
+            self.pages.popitem(last=False)
+        self.pages[page_addr] = page
+
+    def _read_pages(self, inferior, first_page, count):
+        """Read `count` pages from `first_page` in one read; returns False if they cannot all be read"""
+        try:
+            data = read_memory_direct(inferior, first_page, count * self.page_size)
+        except gdb.MemoryError:
+            return False
+        self.block_reads += 1
+        for idx in range(count):
+            self._add_page(first_page + idx * self.page_size,
+                           data[idx * self.page_size:(idx + 1) * self.page_size].tobytes())
+        return True
+
+    def _get_page(self, inferior, page_addr):
+        page = self.pages.get(page_addr)
+        if page is not None:
+            self.hits += 1
+            # move to the end: most recently used
+            del self.pages[page_addr]
+            self.pages[page_addr] = page
+            return page
+        self.misses += 1
+        if self.remote and self.read_ahead > 1:
+            block_size = self.read_ahead * self.page_size
+            if self._read_pages(inferior, page_addr - page_addr % block_size, self.read_ahead):
+                return self.pages.get(page_addr)
+        try:
+            page = read_memory_direct(inferior, page_addr, self.page_size).tobytes()
+        except gdb.MemoryError:
+            # e.g. the page is only partially mapped
+            return None
+        self._add_page(page_addr, page)
+        return page
+
+    def prefetch(self, ranges):
+        """
+        Make sure the pages holding `ranges`, an iterable of (address, size), are cached.
+
+        Consecutive missing pages are read at once. Unreadable memory is ignored.
+        """
+        inferior = self._check_inferior()
+        if not self.enabled:
+            return
+        missing = set()
+        for addr, size in ranges:
+            page_addr = addr - addr % self.page_size
+            while page_addr < addr + size:
+                if page_addr not in self.pages:
+                    missing.add(page_addr)
+                page_addr += self.page_size
+        missing = sorted(missing)
+        while missing:
+            count = 1
+            while count < len(missing) and missing[count] == missing[0] + count * self.page_size:
+                count += 1
+            if count == 1 or not self._read_pages(inferior, missing[0], count):
+                for page_addr in missing[:count]:
+                    self._get_page(inferior, page_addr)
+            missing = missing[count:]
+
+    def read(self, addr, size):
+        """
+        Read `size` bytes at address `addr` of the selected inferior.
+
+        Raises:
+          gdb.MemoryError, if the memory cannot be read.
+        """
+        inferior = self._check_inferior()
+        if not self.enabled or size > self.page_size:
+            self.uncached_reads += 1
+            return read_memory_direct(inferior, addr, size).tobytes()
+        page_addr = addr - addr % self.page_size
+        offset = addr - page_addr
+        if offset + size > self.page_size:
+            # both pages in one read
+            self.prefetch([(addr, size)])
+        page = self._get_page(inferior, page_addr)
+        if page is not None and offset + size <= self.page_size:
+            return page[offset:offset + size]
+        next_page = self._get_page(inferior, page_addr + self.page_size) if page is not None else None
+        if next_page is None:
+            # read exactly what is asked, raising gdb.MemoryError if it cannot be read
+            self.uncached_reads += 1
+            return read_memory_direct(inferior, addr, size).tobytes()
+        return page[offset:] + next_page[:offset + size - self.page_size]
+
+
+page_cache = Page_Cache()
+
+
+def read_memory(addr, size):
+    """
+    Read `size` bytes at address `addr` of the selected inferior, through the page cache.
+    """
+    return page_cache.read(addr, size)
+
+
+def prefetch_memory(ranges):
+    """
+    Read the memory of the selected inferior at `ranges`, an iterable of (address, size),
+    into the page cache, with as few reads as possible.
+    """
+    page_cache.prefetch(ranges)
+
+
+def read_memory_bulk(addr, size):
+    """
+    Read a large block of `size` bytes at address `addr` of the selected inferior, as a memoryview.
+
+    The page cache is skipped; live local inferiors are read through /proc/<pid>/mem.
+
+    Raises:
+      gdb.MemoryError, if the memory cannot be read.
+    """
+    return read_memory_direct(gdb.selected_inferior(), addr, size)
+
+
+# inferior memory might change whenever the inferior runs, calls a function,
+# or is written to by gdb
+if hasattr(gdb, 'events'):
+    for _event_name in ['cont', 'memory_changed', 'inferior_call', 'exited', 'new_inferior']:
+        if hasattr(gdb.events, _event_name):
+            getattr(gdb.events, _event_name).connect(page_cache.invalidate)
+    # the pid might get reused by another process, or another core file loaded
+    if hasattr(gdb.events, 'exited'):
+        gdb.events.exited.connect(proc_mem_reader.close)
+        gdb.events.exited.connect(core_file_reader.close)
+
+
+def _on_target_change(event=None):
+    page_cache.invalidate()
+    page_cache.inferior = None
+    proc_mem_reader.close()
+    core_file_reader.close()
+
+
+# loading a core file or an executable, or disconnecting, changes what the inferior memory is:
+# neither `kill` nor `core-file` report the inferior as exited
+if hasattr(gdb, 'events'):
+    for _event_name in ['new_objfile', 'clear_objfiles', 'connection_removed']:
+        if hasattr(gdb.events, _event_name):
+            getattr(gdb.events, _event_name).connect(_on_target_change)
+
+
+class Memory_Cache_Parameter(gdb.Parameter):
+    """
+    Cache inferior memory read by the boost printers.
+
+    When on, memory is read in pages, so that printing a large container
+    needs few reads from the target. The cache is emptied whenever the
+    inferior resumes or its memory is written to.
+    """
+    set_doc = 'Set whether boost printers cache inferior memory.'
+    show_doc = 'Show whether boost printers cache inferior memory.'
+
+    def __init__(self):
+        super(Memory_Cache_Parameter, self).__init__('boost-memory-cache', gdb.COMMAND_DATA, gdb.PARAM_BOOLEAN)
+        self.value = True
+
+    def get_set_string(self):
+        page_cache.enabled = self.value
+        page_cache.invalidate()
+        return ''
+
+    def get_show_string(self, svalue):
+        return 'Caching of inferior memory by boost printers is ' + svalue + '.'
+
+
+Memory_Cache_Parameter()
+
+
+class Read_Ahead_Parameter(gdb.Parameter):
+    """
+    Number of pages read at once by the boost printers memory cache on remote targets.
+
+    With gdbserver and other remote targets, a page missing from the cache is read
+    together with the other pages of its aligned block of this many pages, so that
+    nearby nodes of linked containers need no more round trips. 0 or 1 disables
+    read-ahead.
+    """
+    set_doc = 'Set the number of pages read at once from remote targets by boost printers.'
+    show_doc = 'Show the number of pages read at once from remote targets by boost printers.'
+
+    def __init__(self):
+        super(Read_Ahead_Parameter, self).__init__('boost-read-ahead', gdb.COMMAND_DATA, gdb.PARAM_ZUINTEGER)
+        self.value = page_cache.read_ahead
+
+    def get_set_string(self):
+        page_cache.read_ahead = self.value
+        return ''
+
+    def get_show_string(self, svalue):
+        return 'Boost printers read ' + svalue + ' pages at once from remote targets.'
+
+
+Read_Ahead_Parameter()
+
+
+class Direct_Memory_Parameter(gdb.Parameter):
+    """
+    Read the memory of live local inferiors and core files directly.
+
+    When on, the boost printers read the memory of an inferior running
+    on this machine (native target) through /proc/<pid>/mem, and the
+    memory of a core file through a memory map of it, instead of through
+    gdb. Remote targets are always read through gdb.
+    """
+    set_doc = 'Set whether boost printers read local inferior and core file memory directly.'
+    show_doc = 'Show whether boost printers read local inferior and core file memory directly.'
+
+    def __init__(self):
+        super(Direct_Memory_Parameter, self).__init__('boost-direct-memory', gdb.COMMAND_DATA, gdb.PARAM_BOOLEAN)
+        self.value = True
+
+    def get_set_string(self):
+        for reader in [proc_mem_reader, core_file_reader]:
+            reader.enabled = self.value
+            reader.close()
+        return ''
+
+    def get_show_string(self, svalue):
+        return 'Direct reads of local inferior and core file memory by boost printers are ' + svalue + '.'
+
+
+Direct_Memory_Parameter()
+
+
+class Memory_Stats_Command(gdb.Command):
+    """
+    Show statistics of the boost printers memory cache.
+
+    Usage: boost-memory-stats [reset]
+    """
+
+    def __init__(self):
+        super(Memory_Stats_Command, self).__init__('boost-memory-stats', gdb.COMMAND_DATA)
+
+    def invoke(self, arg, from_tty):
+        if arg.strip() == 'reset':
+            page_cache.reset_stats()
+            proc_mem_reader.reads = proc_mem_reader.bytes_read = 0
+            core_file_reader.reads = core_file_reader.bytes_read = 0
+            return
+        elif arg.strip():
+            raise gdb.GdbError('boost-memory-stats: unknown argument: ' + arg)
+        c = page_cache
+        lookups = c.hits + c.misses
+        gdb.write('Memory cache: {}, {} pages of {} bytes cached\n'.format(
+            'on' if c.enabled else 'off', len(c.pages), c.page_size))
+        gdb.write('Page hits: {}, misses: {} ({:.1f}% hits)\n'.format(
+            c.hits, c.misses, 100.0 * c.hits / lookups if lookups else 0.0))
+        gdb.write('Uncached reads: {}, invalidations: {}\n'.format(c.uncached_reads, c.invalidations))
+        gdb.write('Multi-page reads: {}, read-ahead: {} pages{}\n'.format(
+            c.block_reads, c.read_ahead, ' (remote target)' if c.remote else ' (remote targets only)'))
+        gdb.write('Direct reads from /proc/<pid>/mem: {} ({} bytes){}\n'.format(
+            proc_mem_reader.reads, proc_mem_reader.bytes_read,
+            ', active' if proc_mem_reader.fd is not None else ''))
+        gdb.write('Direct reads from the core file: {} ({} bytes){}\n'.format(
+            core_file_reader.reads, core_file_reader.bytes_read,
+            ', active' if core_file_reader.core is not None else ''))
+
+
+Memory_Stats_Command()
@@ -67,6 +67,11 @@ def _boost_multi_index_get_indexes(v):
     for r in arg2_args:
         v.indexes.append(arg2_str[r[0]:r[1]].split('<')[0].strip())
 
+def _read_node_ptr(node_ptr, idx):
+    "Read the idx-th pointer of the index fields at address node_ptr, straight from inferior memory."
+    ptr_size = pointer_size()
+    return read_pointer(node_ptr + idx * ptr_size, ptr_size)
+
 # The size in pointers of the index fields for all index types.
 _boost_multi_index_index_size = {}
 _boost_multi_index_index_size['boost::multi_index::ordered_unique'] = 3
@@ -191,7 +196,7 @@ class Boost_Multi_Index:
         #message('elem_type: ' + str(self.elem_type))
 
         # next, we compute the element size and round it up to the pointer size
-        ptr_size = gdb.lookup_type('void').pointer().sizeof
+        ptr_size = pointer_size()
         self.elem_size = ((self.elem_type.sizeof - 1) / ptr_size + 1) * ptr_size
         #message('elem_size: ' + str(self.elem_size))
 
@@ -254,15 +259,15 @@ class Boost_Multi_Index:
     class ordered_iterator:
         @staticmethod
         def get_parent_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ')')), 16) & (~intptr(1))
+            return _read_node_ptr(node_ptr, 0) & (~intptr(1))
 
         @staticmethod
         def get_left_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ' + 1)')), 16)
+            return _read_node_ptr(node_ptr, 1)
 
         @staticmethod
         def get_right_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ' + 2)')), 16)
+            return _read_node_ptr(node_ptr, 2)
 
         def __init__(self, elem_type, index_offset, first, last):
             self.elem_type = elem_type
@@ -302,8 +307,7 @@ class Boost_Multi_Index:
             self.count = self.count + 1
             val_ptr = Boost_Multi_Index.get_val_ptr(crt, self.index_offset)
             return ('[%s]' % hex(int(val_ptr)),
-                    str(parse_and_eval('*(' + str(self.elem_type) + '*)'
-                                       + str(val_ptr))))
+                    str(gdb.Value(val_ptr).cast(self.elem_type.pointer()).dereference()))
 
         def next(self):
             return self.__next__()
@@ -311,11 +315,11 @@ class Boost_Multi_Index:
     class hashed_iterator:
         @staticmethod
         def get_prev_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ')')), 16)
+            return _read_node_ptr(node_ptr, 0)
 
         @staticmethod
         def get_next_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ' + 1)')), 16)
+            return _read_node_ptr(node_ptr, 1)
 
         def __init__(self, elem_type, index_offset, begin, end):
             self.elem_type = elem_type
@@ -342,8 +346,7 @@ class Boost_Multi_Index:
             self.count = self.count + 1
             val_ptr = Boost_Multi_Index.get_val_ptr(crt, self.index_offset)
             return ('[%s]' % hex(int(val_ptr)),
-                    str(parse_and_eval('*(' + str(self.elem_type) + '*)'
-                                       + str(val_ptr))))
+                    str(gdb.Value(val_ptr).cast(self.elem_type.pointer()).dereference()))
 
         def next(self):
             return self.__next__()
@@ -351,11 +354,11 @@ class Boost_Multi_Index:
     class sequenced_iterator:
         @staticmethod
         def get_prev_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ')')), 16)
+            return _read_node_ptr(node_ptr, 0)
 
         @staticmethod
         def get_next_ptr(node_ptr):
-            return intptr(str(parse_and_eval('*((void**)' + str(node_ptr) + ' + 1)')), 16)
+            return _read_node_ptr(node_ptr, 1)
 
         def __init__(self, elem_type, index_offset, begin, end):
             self.elem_type = elem_type
@@ -376,8 +379,7 @@ class Boost_Multi_Index:
             self.count = self.count + 1
             val_ptr = Boost_Multi_Index.get_val_ptr(crt, self.index_offset)
             return ('[%s]' % hex(int(val_ptr)),
-                    str(parse_and_eval('*(' + str(self.elem_type) + '*)'
-                                       + str(val_ptr))))
+                    str(gdb.Value(val_ptr).cast(self.elem_type.pointer()).dereference()))
 
         def next(self):
             return self.__next__()
@@ -36,6 +36,7 @@
 from __future__ import print_function
 import re
 from .utils import *
+from .bitset import bitset_format, read_bitset
 
 
 #
@@ -49,9 +50,16 @@ from .utils import *
 # and max versions of boost supported by the printer. Required.
 # - 'supports(GDB_Value_Wrapper)' classmethod : If it exists, it is used to
 # determine if the Printer supports the given object.
+# - 'supports_type_only' : If True, supports() only looks at the type of the
+# object, so its result is computed once per type and cached.
 # - 'template_name' : string or list of strings. Only objects with this
 # template name will attempt to use this printer.
 # (Either supports() or template_name is required.)
+# - 'template_namespace' : string or list of strings. For printers without
+# template_name, only objects whose template name is inside one of these
+# namespaces (e.g. 'boost::intrusive') will call supports(). Classes whose
+# first base class (or first base of that, up to 5 levels) is in one of these
+# namespaces also call supports(), after the other candidates.
 # - '__init__' : Its only argument is a GDB_Value_Wrapper.
 #
 
@@ -91,6 +99,12 @@ class BoostIteratorRange:
     def children(self):
         return self._iterator(self.value['m_Begin'], self.value['m_End'])
 
+    def native_value(self):
+        begin = self.value['m_Begin']
+        if get_basic_type(begin.type).code != gdb.TYPE_CODE_PTR:
+            return None
+        return native_array(begin, int(self.value['m_End'] - begin))
+
     def to_string(self):
         begin = self.value['m_Begin']
         end = self.value['m_End']
@@ -111,14 +125,19 @@ class BoostOptional:
     def __init__(self, value):
         self.value = value
 
+    def get_value(self):
+        """Get the stored value, or None if not initialized"""
+        if not self.value['m_initialized']:
+            return None
+        stored_type = get_basic_type(self.value.basic_type.template_argument(0))
+        m_storage = self.value['m_storage']
+        return m_storage \
+            if get_basic_type(m_storage.type) == stored_type \
+            else reinterpret_cast(m_storage['dummy_']['data'], stored_type)
+
     def children(self):
-        initialized = self.value['m_initialized']
-        if initialized:
-            stored_type = get_basic_type(self.value.basic_type.template_argument(0))
-            m_storage = self.value['m_storage']
-            stored_value = m_storage \
-                if get_basic_type(m_storage.type) == stored_type \
-                else reinterpret_cast(m_storage['dummy_']['data'], stored_type)
+        stored_value = self.get_value()
+        if stored_value is not None:
             yield 'value', stored_value
 
     def to_string(self):
@@ -226,13 +245,17 @@ class BoostSharedPtr:
         self.typename = value.type_name
         self.value = value
 
+    def get_counts(self):
+        """Get the use count and weak count of the control block"""
+        if self.value['pn']['pi_'] == 0:
+            return 0, 0
+        countobj = self.value['pn']['pi_'].dereference()
+        return read_atomic_counter(countobj['use_count_']), read_atomic_counter(countobj['weak_count_'])
+
     def to_string(self):
         if self.value['px'] == 0x0:
             return 'uninitialized'
-        countobj = self.value['pn']['pi_'].dereference()
-        refcount = read_atomic_counter(countobj['use_count_'])
-        weakcount = read_atomic_counter(countobj['weak_count_'])
-        return 'count {}, weak count {}'.format(refcount, weakcount)
+        return 'count {}, weak count {}'.format(*self.get_counts())
 
     def children(self):
         if self.value['px'] != 0:
@@ -270,47 +293,43 @@ class BoostCircular:
     max_supported_version = last_supported_boost_version
     template_name = 'boost::circular_buffer'
 
-    class _iterator:
-        def __init__(self, first, last, buff, end, size):
-            self.item = first  # virtual beginning of the circular buffer
-            self.last = last   # virtual end of the circular buffer (one behind the last element).
-            self.buff = buff   # internal buffer used for storing elements in the circular buffer
-            self.end = end     # internal buffer's end (end of the storage space).
-            self.size = size
-            self.capa = int(end - buff)
-            self.count = 0
-
-        def __iter__(self):
-            return self
-
-        def __next__(self):
-            if self.count == self.size:
-                raise StopIteration
-            count = self.count
-            crt = self.buff + (count + self.item - self.buff) % self.capa
-            elem = crt.dereference()
-            self.count = self.count + 1
-            return ('[%d]' % count, elem)
-
-        def next(self):
-            return self.__next__()
-
     def __init__(self, value):
         self.typename = value.type_name
         self.value = value
 
+    def get_size(self):
+        return int(self.value['m_size'])
+
+    def get_element(self, idx):
+        buff = self.value['m_buff']
+        capa = int(self.value['m_end'] - buff)
+        return (buff + (int(self.value['m_first'] - buff) + idx) % capa).dereference()
+
+    def get_runs(self):
+        """
+        Get the elements as at most two runs of contiguous elements, in order: a list of
+        (pointer to the first element, number of elements). The second run is empty unless
+        the elements wrap around the end of the internal buffer.
+        """
+        first = self.value['m_first']
+        size = self.get_size()
+        first_run = min(size, int(self.value['m_end'] - first))
+        return [(first, first_run), (self.value['m_buff'], size - first_run)]
+
     def children(self):
-        return self._iterator(self.value['m_first'],
-                              self.value['m_last'],
-                              self.value['m_buff'],
-                              self.value['m_end'],
-                              self.value['m_size'])
+        idx = 0
+        for start, count in self.get_runs():
+            for elem in contiguous_values(start, count):
+                yield '[%d]' % idx, elem
+                idx += 1
 
     def to_string(self):
         buff = self.value['m_buff']
         end = self.value['m_end']
         size = self.value['m_size']
-        return '%s of length %d/%d' % (self.typename, int(size), int(end - buff))
+        (_, first_run), (_, second_run) = self.get_runs()
+        wrap = ' wrapped at [%d]' % first_run if second_run else ''
+        return '%s%s of length %d/%d' % (self.typename, wrap, int(size), int(end - buff))
 
     def display_hint(self):
         return 'array'
@@ -328,12 +347,30 @@ class BoostArray:
         self.value = value
         self.size = int(value.type.template_argument(1))
 
+    def get_size(self):
+        return self.size
+
+    def get_element(self, idx):
+        return self.value['elems'][idx]
+
+    def get_start(self):
+        # None for arrays that are not in inferior memory, e.g. function results
+        return self.value['elems'][0].address if self.size else None
+
+    def native_value(self):
+        return native_array(self.get_start(), self.size)
+
     def to_string(self):
         return None
 
     def children(self):
-        for idx in range(self.size):
-            yield '[{}]'.format(idx), self.value['elems'][idx]
+        start = self.get_start()
+        if start is None:
+            elems = (self.get_element(idx) for idx in range(self.size))
+        else:
+            elems = contiguous_values(start, self.size)
+        for idx, elem in enumerate(elems):
+            yield '[{}]'.format(idx), elem
 
     def display_hint(self):
         return 'array'
@@ -356,11 +393,19 @@ class BoostSmallVector:
         capacity = max(static_storage_capacity, int(m_holder['m_capacity']))
         return 'size={} capacity={}'.format(m_holder['m_size'], capacity)
 
+    def get_size(self):
+        return int(self.value['m_holder']['m_size'])
+
+    def get_element(self, idx):
+        return self.value['m_holder']['m_start'][idx]
+
+    def native_value(self):
+        return native_array(self.value['m_holder']['m_start'], self.get_size())
+
     def children(self):
         m_holder = self.value['m_holder']
-        size = int(m_holder['m_size'])
-        for idx in range(size):
-            yield '[{}]'.format(idx), m_holder['m_start'][idx]
+        for idx, elem in enumerate(contiguous_values(m_holder['m_start'], self.get_size())):
+            yield '[{}]'.format(idx), elem
 
     def display_hint(self):
         return 'array'
@@ -382,11 +427,19 @@ class BoostSmallVectorBase:
         m_holder = self.value['m_holder']
         return 'size={}'.format(m_holder['m_size'])
 
+    def get_size(self):
+        return int(self.value['m_holder']['m_size'])
+
+    def get_element(self, idx):
+        return self.value['m_holder']['m_start'][idx]
+
+    def native_value(self):
+        return native_array(self.value['m_holder']['m_start'], self.get_size())
+
     def children(self):
         m_holder = self.value['m_holder']
-        size = int(m_holder['m_size'])
-        for idx in range(size):
-            yield '[{}]'.format(idx), m_holder['m_start'][idx]
+        for idx, elem in enumerate(contiguous_values(m_holder['m_start'], self.get_size())):
+            yield '[{}]'.format(idx), elem
 
     def display_hint(self):
         return 'array'
@@ -406,13 +459,23 @@ class BoostStaticVector:
     def to_string(self):
         return 'size={}'.format(self.value['m_holder']['m_size'])
 
-    def children(self):
+    def get_size(self):
+        return int(self.value['m_holder']['m_size'])
+
+    def get_elements(self):
         element_type = self.value.type.template_argument(0)
         data_storage = self.value['m_holder']['storage']
-        elements = data_storage.address.cast(element_type.pointer())
-        size = int(self.value['m_holder']['m_size'])
-        for idx in range(size):
-            yield '[{}]'.format(idx), elements[idx]
+        return data_storage.address.cast(element_type.pointer())
+
+    def get_element(self, idx):
+        return self.get_elements()[idx]
+
+    def native_value(self):
+        return native_array(self.get_elements(), self.get_size())
+
+    def children(self):
+        for idx, elem in enumerate(contiguous_values(self.get_elements(), self.get_size())):
+            yield '[{}]'.format(idx), elem
 
     def display_hint(self):
         return 'array'
@@ -429,22 +492,27 @@ class BoostDynamicBitset:
         self.value = value
 
     def to_string(self):
-        return 'size={}'.format(self.value['m_num_bits'])
+        size = 'size={}'.format(self.value['m_num_bits'])
+        if bitset_format.value == 'bits':
+            return '{} bits={}'.format(size, self.get_bits().to_bit_string())
+        elif bitset_format.value == 'hex':
+            return '{} hex={}'.format(size, self.get_bits().to_hex_string())
+        elif bitset_format.value == 'ranges':
+            bits = self.get_bits()
+            return '{} count={} set={}'.format(size, bits.count(), bits.to_ranges_string())
+        return size
+
+    def get_bits(self):
+        # the blocks are read once per printer
+        if not hasattr(self, 'bits'):
+            self.bits = read_bitset(self.value)
+        return self.bits
 
     def children(self):
-        num_bits = int(self.value['m_num_bits'])
-        block_size = int(self.value['bits_per_block'])
-
-        data_vis = gdb.default_visualizer(self.value['m_bits'])
-        if data_vis is None:
+        if bitset_format.value != 'children':
             return
-        data = [int(value) for index_str, value in data_vis.children()]
-
-        for block_idx, block in enumerate(data):
-            bits_in_block = num_bits % block_size if block_idx == len(data) - 1 else block_size
-            for bit_idx in range(bits_in_block):
-                bit_value = 1 if block & (1 << bit_idx) else 0
-                yield '[{}]'.format(block_idx * block_size + bit_idx), bit_value
+        for idx, bit in enumerate(self.get_bits().bits()):
+            yield '[{}]'.format(idx), bit
 
     def display_hint(self):
         return 'array'
@@ -0,0 +1,194 @@
+# encoding: utf-8
+
+#
+# boost-snapshot: print values with the inferior paused as briefly as possible
+#
+# Printing a large container keeps the inferior stopped while the printers walk it
+# and gdb formats every element. boost-snapshot splits this in two passes:
+#
+# 1. capture: the printers are run and every leaf value is fetched from memory
+#    (gdb.Value.fetch_lazy()), without formatting anything. Fetched values keep
+#    their contents in gdb, so they can be formatted later without the inferior.
+# 2. render: once the inferior has been resumed or detached, the captured tree is
+#    formatted like `print` does with `set print pretty off`.
+#
+# Only char pointers and lazy strings are formatted during the capture, since
+# formatting them reads the string from memory.
+#
+
+from __future__ import print_function, absolute_import, division
+import itertools
+import time
+import gdb
+from .utils import *
+
+char_type_codes = [gdb.TYPE_CODE_INT, gdb.TYPE_CODE_CHAR]
+
+
+class Snapshot_Node(object):
+    """
+    A value captured by boost-snapshot.
+
+    `text` is the formatted value, or `value` a fetched gdb.Value to be formatted later.
+    `children` is a list of (name, Snapshot_Node), or None for values without children;
+    `label` is then the Snapshot_Node of the printer to_string(), if any.
+    """
+    def __init__(self, text=None, value=None, label=None, hint=None, children=None, truncated=False):
+        self.text = text
+        self.value = value
+        self.label = label
+        self.hint = hint
+        self.children = children
+        self.truncated = truncated
+
+    def count(self):
+        return 1 + sum(child.count() for _, child in self.children or [])
+
+
+def get_limit(name, default, unlimited):
+    """
+    Get the value of limit parameter `name`: `unlimited` if it is set to unlimited
+    (gdb returns None or -1), or `default` if this gdb does not have it.
+    """
+    try:
+        limit = gdb.parameter(name)
+    except RuntimeError:
+        # e.g. gdb < 9 has no 'print max-depth'
+        return default
+    return unlimited if limit is None or limit < 0 else limit
+
+
+def is_char_pointer(t):
+    if t.code not in [gdb.TYPE_CODE_PTR, gdb.TYPE_CODE_ARRAY]:
+        return False
+    target = get_basic_type(t.target())
+    return target.code in char_type_codes and target.sizeof == 1
+
+
+class Snapshot_Capture(object):
+    """Capture of values, limited like `print` by 'print elements' and 'print max-depth'"""
+    def __init__(self):
+        # 0 elements means no limit, as for 'print elements'
+        self.max_elements = get_limit('print elements', 200, 0)
+        self.max_depth = get_limit('print max-depth', 20, float('inf'))
+
+    def leaf(self, v):
+        if is_char_pointer(get_basic_type(v.type)):
+            return Snapshot_Node(text=str(v))
+        v.fetch_lazy()
+        return Snapshot_Node(value=v)
+
+    def children(self, items, depth):
+        if self.max_elements:
+            items = itertools.islice(items, self.max_elements + 1)
+        children = [(str(name), self.capture(child, depth + 1)) for name, child in items]
+        truncated = bool(self.max_elements) and len(children) > self.max_elements
+        return children[:self.max_elements] if truncated else children, truncated
+
+    def capture(self, v, depth=0):
+        if not isinstance(v, gdb.Value):
+            # printers may return python strings and numbers
+            return Snapshot_Node(text=str(v))
+        t = get_basic_type(v.type)
+        if t.code == gdb.TYPE_CODE_REF or t.code == getattr(gdb, 'TYPE_CODE_RVALUE_REF', None):
+            return self.capture(v.referenced_value(), depth)
+        printer = gdb.default_visualizer(v)
+        if printer is not None:
+            return self.capture_printer(printer, depth)
+        if t.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION]:
+            if depth >= self.max_depth:
+                return Snapshot_Node(text='{...}')
+            fields = [('<{}>'.format(f.name) if f.is_base_class else f.name or '<anonymous>', v[f])
+                      for f in t.fields() if hasattr(f, 'bitpos')]
+            children, truncated = self.children(fields, depth)
+            return Snapshot_Node(hint='struct', children=children, truncated=truncated)
+        if t.code == gdb.TYPE_CODE_ARRAY and not is_char_pointer(t):
+            low, high = t.range()
+            children, truncated = self.children((('', v[idx]) for idx in range(low, high + 1)), depth)
+            return Snapshot_Node(hint='array', children=children, truncated=truncated)
+        return self.leaf(v)
+
+    def capture_printer(self, printer, depth):
+        text = None
+        if hasattr(printer, 'to_string'):
+            s = printer.to_string()
+            if isinstance(s, gdb.Value):
+                text = self.capture(s, depth)
+            elif isinstance(s, gdb.LazyString):
+                text = Snapshot_Node(text=str(s.value()))
+            elif s is not None:
+                text = Snapshot_Node(text=str(s))
+        hint = printer.display_hint() if hasattr(printer, 'display_hint') else None
+        if not hasattr(printer, 'children') or hint == 'string':
+            return text or Snapshot_Node(text='')
+        if depth >= self.max_depth:
+            children, truncated = [], True
+        else:
+            children, truncated = self.children(printer.children(), depth)
+        return Snapshot_Node(label=text, hint=hint, children=children, truncated=truncated)
+
+
+def render(node):
+    """Format a captured Snapshot_Node like `print` does, on one line"""
+    if node.children is None:
+        return node.text if node.value is None else str(node.value)
+    children = node.children
+    if node.hint == 'map':
+        items = ['[{}] = {}'.format(render(children[idx][1]), render(children[idx + 1][1]))
+                 for idx in range(0, len(children) - 1, 2)]
+    elif node.hint == 'array':
+        items = [render(child) for _, child in children]
+    else:
+        items = ['{} = {}'.format(name, render(child)) for name, child in children]
+    if node.truncated:
+        items.append('...')
+    elements = '{' + ', '.join(items) + '}'
+    label = render(node.label) if node.label is not None else ''
+    if label:
+        return label + ' ' + elements if items else label
+    return elements
+
+
+class Snapshot_Command(gdb.Command):
+    """
+    Capture values with the boost printers, then resume or detach, then print them.
+
+    Usage: boost-snapshot [-continue | -detach] EXPRESSION [, EXPRESSION]...
+    Memory is read while the inferior is stopped; the values are formatted after
+    it has been resumed in the background (-continue) or detached (-detach).
+    Containers are limited to 'print elements' elements, and nesting to 'print max-depth'.
+    """
+
+    def __init__(self):
+        super(Snapshot_Command, self).__init__('boost-snapshot', gdb.COMMAND_DATA, gdb.COMPLETE_EXPRESSION)
+
+    def invoke(self, arg, from_tty):
+        action = None
+        arg = arg.strip()
+        for option in ['-continue', '-detach']:
+            if arg.startswith(option + ' '):
+                action, arg = option[1:], arg[len(option):]
+        expressions = split_expressions(arg)
+        if not expressions:
+            raise gdb.GdbError('boost-snapshot: no expression given')
+
+        start = time.time()
+        capture = Snapshot_Capture()
+        nodes = [capture.capture(gdb.parse_and_eval(expression)) for expression in expressions]
+        capture_time = time.time() - start
+        try:
+            if action == 'continue':
+                gdb.execute('continue &', to_string=True)
+            elif action == 'detach':
+                gdb.execute('detach', to_string=True)
+        except gdb.error as e:
+            # e.g. 'continue &' needs an asynchronous target
+            message('boost-snapshot: cannot {}: {}'.format(action, e))
+
+        for expression, node in zip(expressions, nodes):
+            gdb.write('{} = {}\n'.format(expression, render(node)))
+        gdb.write('{} values captured in {:.1f} ms\n'.format(
+            sum(node.count() for node in nodes), capture_time * 1000))
+
+
+Snapshot_Command()
@@ -36,7 +36,22 @@ class BoostUnorderedCommon:
     @staticmethod
     def nodes(start_node):
         """Generator iterating over all nodes in unordered container"""
-        node_ptr = start_node.address
+        node_t = get_basic_type(start_node.type)
+        node_addr = intptr(start_node.address)
+        while True:
+            # follow raw next_ pointers by reading memory directly, through the page cache
+            next_field = field_offset(node_t, 'next_')
+            if next_field is None or get_basic_type(next_field[1]).code != gdb.TYPE_CODE_PTR:
+                break
+            offset, next_ptr_t = next_field
+            next_addr = read_pointer(node_addr + offset, next_ptr_t.sizeof)
+            if not next_addr or next_addr == node_addr:
+                return
+            node_addr = next_addr
+            node_t = get_basic_type(next_ptr_t).target()
+            yield gdb.Value(node_addr).cast(next_ptr_t).dereference()
+        # fancy pointers: let gdb follow them
+        node_ptr = gdb.Value(node_addr).cast(node_t.pointer())
         while True:
             next_ptr = node_ptr.dereference()['next_']
             if not next_ptr or next_ptr == node_ptr:
@@ -44,8 +59,20 @@ class BoostUnorderedCommon:
             node_ptr = next_ptr
             yield node_ptr.dereference()
 
-    def stored_items(self):
-        """Generator iterating over all items stored in container"""
+    @staticmethod
+    def data_offset(node_type):
+        """Offset of the stored item in nodes of type `node_type`, or None"""
+        value_base = field_offset(node_type, 'value_base_')
+        data = field_offset(value_base[1], 'data_') if value_base is not None else None
+        return value_base[0] + data[0] if data is not None else None
+
+    def stored_items(self, copy_plain=False):
+        """Generator iterating over all items stored in container
+
+        With `copy_plain`, items of plain types (see is_plain_type()) are built from the node
+        bytes, read through the page cache along with the next_ pointer of the node, rather
+        than fetched by gdb one node at a time. These items are not lvalues.
+        """
         table = self.val['table_']
         buckets = table['buckets_']
         if not buckets:
@@ -64,9 +91,16 @@ class BoostUnorderedCommon:
         bucket_count = table['bucket_count_']
         start_node = buckets[bucket_count]
 
+        data_offset = self.data_offset(get_basic_type(node_type)) if copy_plain and can_build_values() else None
+        plain = None if data_offset is not None else False
         for node in itertools.islice(self.nodes(start_node), 1 if extra_node else 0, None):
+            if plain:
+                yield gdb.Value(read_memory(intptr(node.address) + data_offset, value_type.sizeof), value_type)
+                continue
             node_data = reinterpret_cast(node, node_type)['value_base_']['data_']
             stored_value = reinterpret_cast(node_data, value_type)
+            if plain is None:
+                plain = is_plain_type(value_type, stored_value)
             yield stored_value
 
     def size(self):
@@ -94,7 +128,7 @@ class BoostUnorderedMapPrinter(BoostUnorderedCommon):
         return '{}<{}, {}> size = {}'.format(template_name, key_type, value_type, self.size())
 
     def children(self):
-        for item_number, item in enumerate(self.stored_items()):
+        for item_number, item in enumerate(self.stored_items(copy_plain=True)):
             yield 'key[{}]'.format(item_number), item['first']
             yield 'value[{}]'.format(item_number), item['second']
 
@@ -120,7 +154,7 @@ class BoostUnorderedSetPrinter(BoostUnorderedCommon):
         return '{}<{}> size = {}'.format(template_name, value_type, self.size())
 
     def children(self):
-        for item_number, item in enumerate(self.stored_items()):
+        for item_number, item in enumerate(self.stored_items(copy_plain=True)):
             yield '[{}]'.format(item_number), item
 
     def display_hint(self):
@@ -6,8 +6,13 @@ import gdb.printing
 from gdb import lookup_type
 import sys
 import collections
+import weakref
+import importlib
+import time
+import struct
 
-from .detect_version import detect_boost_version
+from .detect_version import detect_boost_version, scan_object_file
+from .memory import read_memory, read_memory_bulk, prefetch_memory
 
 #
 # Indicators for python2 and python3
@@ -103,27 +108,73 @@ except ImportError:
         return gdb.history(0)
 
 
-def get_type_qualifiers(t):
+#
+# Caches of type-level facts.
+#
+# Every Type_Cache is emptied when objfiles are loaded or cleared, since the
+# types they describe might have changed or disappeared.
+#
+_type_caches = weakref.WeakValueDictionary()
+
+
+class Type_Cache(collections.OrderedDict):
     """
-    Get string containing the qualifiers of a gdb.Type: const, volatile, and reference.
+    Dictionary keyed by type_key() (alone or within a tuple), emptied whenever objfiles change.
+
+    If `maxsize` is given, the oldest entries are dropped to keep at most `maxsize` entries.
+    """
+    def __init__(self, maxsize=None):
+        super(Type_Cache, self).__init__()
+        self.maxsize = maxsize
+        _type_caches[id(self)] = self
+
+    def __setitem__(self, key, value):
+        if self.maxsize is not None and key not in self:
+            while len(self) >= self.maxsize:
+                self.popitem(last=False)
+        super(Type_Cache, self).__setitem__(key, value)
+
+
+def clear_type_caches(event=None):
+    """
+    Empty all type caches. Connected to the `new_objfile` and `clear_objfiles` events.
+    """
+    for cache in list(_type_caches.values()):
+        cache.clear()
+
+
+if hasattr(gdb, 'events'):
+    for _event_name in ['new_objfile', 'clear_objfiles']:
+        if hasattr(gdb.events, _event_name):
+            getattr(gdb.events, _event_name).connect(clear_type_caches)
+
+
+def type_key(t):
+    """
+    Get a hashable key identifying gdb.Type `t`, or None if the type has no usable name.
+
+    gdb.Type objects are not hashable, so types are identified by their objfile
+    and the name of their typedef-stripped form.
     """
     assert isinstance(t, gdb.Type)
     t = t.strip_typedefs()
-    qualifiers = ''
+    ref = ''
     if t.code == gdb.TYPE_CODE_REF:
-        qualifiers = '&' + qualifiers
-        t = t.target()
-    if t == t.unqualified():
-        pass
-    elif t == t.unqualified().const():
-        qualifiers = 'c' + qualifiers
-    elif t == t.unqualified().volatile():
-        qualifiers = 'v' + qualifiers
-    elif t == t.unqualified().const().volatile():
-        qualifiers = 'cv' + qualifiers
-    else:
-        assert False, 'could not determine type qualifiers'
-    return qualifiers
+        # strip_typedefs() does not look through references
+        ref = ' &'
+        t = t.target().strip_typedefs()
+    if t.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION, gdb.TYPE_CODE_ENUM] and t.tag is None:
+        # anonymous types all print as "struct {...}"
+        return None
+    return (getattr(t, 'objfile', None), str(t) + ref)
+
+
+def get_type_qualifiers(t):
+    """
+    Get string containing the qualifiers of a gdb.Type: const, volatile, and reference.
+    """
+    assert isinstance(t, gdb.Type)
+    return type_facts(t).qualifiers
 
 
 def template_name(t):
@@ -131,17 +182,130 @@ def template_name(t):
     Get template name of gdb.Type. Only for struct/union/enum.
     """
     assert isinstance(t, gdb.Type)
-    bt = get_basic_type(t)
-    if bt.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION, gdb.TYPE_CODE_ENUM]:
-        return str(bt).split('<')[0]
-    else:
-        return ''
+    return type_facts(t).template_name
+
+
+class lazy_attribute(object):
+    """
+    Decorator turning a method into an attribute that is computed on first access,
+    then stored in the instance.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.name = f.__name__
+        self.__doc__ = f.__doc__
+
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        result = self.f(obj)
+        obj.__dict__[self.name] = result
+        return result
+
+
+class Type_Facts(object):
+    """
+    Facts about a gdb.Type that printers commonly need, each computed on first access.
+
+    `key` is the type_key() of the type.
+    """
+    def __init__(self, t, key=None):
+        assert isinstance(t, gdb.Type)
+        self.type = t
+        self.key = key
+
+    @lazy_attribute
+    def qualifiers(self):
+        t = self.type.strip_typedefs()
+        qualifiers = ''
+        if t.code == gdb.TYPE_CODE_REF:
+            qualifiers = '&' + qualifiers
+            t = t.target()
+        if t == t.unqualified():
+            pass
+        elif t == t.unqualified().const():
+            qualifiers = 'c' + qualifiers
+        elif t == t.unqualified().volatile():
+            qualifiers = 'v' + qualifiers
+        elif t == t.unqualified().const().volatile():
+            qualifiers = 'cv' + qualifiers
+        else:
+            assert False, 'could not determine type qualifiers'
+        return qualifiers
+
+    @lazy_attribute
+    def stripped_name(self):
+        """Type name, stripped of typedefs but not of qualifiers"""
+        return str(self.type.strip_typedefs())
+
+    @lazy_attribute
+    def basic_type(self):
+        return get_basic_type(self.type)
+
+    @lazy_attribute
+    def type_name(self):
+        return str(self.basic_type)
+
+    @lazy_attribute
+    def template_name(self):
+        if self.basic_type.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION, gdb.TYPE_CODE_ENUM]:
+            return self.type_name.split('<')[0]
+        else:
+            return ''
+
+
+# Bounded like _inner_types: a program with many distinct types would otherwise grow it until
+# the objfiles change. Facts dropped here are recomputed on the next lookup.
+_type_facts = Type_Cache(maxsize=4096)
+
+# The same gdb.Type objects (e.g. node traits types kept by printers) are looked up over and
+# over, so facts are also indexed by object identity, which spares computing type_key().
+# Entries hold a reference to the type, so that its id() cannot be reused while cached.
+_type_facts_by_id = Type_Cache(maxsize=1024)
+
+
+def type_facts(t, key=None):
+    """
+    Get the Type_Facts of gdb.Type `t`, shared by all types with the same type_key().
+
+    `key`, if given, must be type_key(`t`).
+    """
+    if key is None:
+        entry = _type_facts_by_id.get(id(t))
+        if entry is not None and entry[0] is t:
+            return entry[1]
+        key = type_key(t)
+        facts = Type_Facts(t) if key is None else _type_facts.get(key)
+        if facts is None:
+            facts = _type_facts[key] = Type_Facts(t, key)
+        _type_facts_by_id[id(t)] = (t, facts)
+        return facts
+    facts = _type_facts.get(key)
+    if facts is None:
+        facts = _type_facts[key] = Type_Facts(t, key)
+    return facts
+
+
+def value_type_facts(v):
+    """
+    Get the Type_Facts of the type of gdb.Value `v`, reusing those of a GDB_Value_Wrapper.
+    """
+    if isinstance(v, GDB_Value_Wrapper):
+        return v.type_facts
+    return type_facts(v.type)
 
 
 class _aux_save_value_as_variable(gdb.Function):
-    def __init__(self, v):
+    """
+    Convenience function returning the value last stored in it.
+
+    A single instance is registered, on first use, and reused for every value.
+    """
+    instance = None
+
+    def __init__(self):
         super(_aux_save_value_as_variable, self).__init__('_aux_save_value_as_variable')
-        self.value = v
+        self.value = None
 
     def invoke(self):
         return self.value
@@ -152,8 +316,14 @@ def save_value_as_variable(v, s):
     Save gdb.Value `v` as gdb variable `s`.
     """
     assert isinstance(v, gdb.Value)
-    assert isinstance(s, str)
-    _aux_save_value_as_variable(v)
+    assert isinstance(s, str) and s.startswith('$')
+    if hasattr(gdb, 'set_convenience_variable'):
+        # gdb >= 8.3
+        gdb.set_convenience_variable(s[1:], v)
+        return
+    if _aux_save_value_as_variable.instance is None:
+        _aux_save_value_as_variable.instance = _aux_save_value_as_variable()
+    _aux_save_value_as_variable.instance.value = v
     gdb.execute('set var ' + s + ' = $_aux_save_value_as_variable()', False, True)
 
 
@@ -164,18 +334,135 @@ def to_eval(val, var_name=None):
     If <val> has an adddress, the string returned will be of the form:
     "(*(<val.type> *)(<val.address>))".
 
-    If <val> has no address, it is first saved as variable <var_name>,
+    If <val> is a pointer or an integer without an address, the string returned
+    is a literal of the form "(<val.type>)<val>".
+
+    Otherwise, <val> is first saved as variable <var_name>,
     then the string returned is "<var_name>".
     """
     assert isinstance(val, gdb.Value)
     if val.address:
         return '(*(' + str(val.type) + ' *)(' + hex(intptr(val.address)) + '))'
+    facts = type_facts(val.type)
+    if facts.basic_type.code == gdb.TYPE_CODE_PTR:
+        return '((' + facts.type_name + ')' + hex(intptr(val)) + ')'
+    elif facts.basic_type.code in [gdb.TYPE_CODE_INT, gdb.TYPE_CODE_BOOL, gdb.TYPE_CODE_CHAR, gdb.TYPE_CODE_ENUM]:
+        return '((' + facts.type_name + ')' + str(intptr(val)) + ')'
     else:
         assert isinstance(var_name, str)
         save_value_as_variable(val, var_name)
         return var_name
 
 
+#
+# Inferior function calls
+#
+# Printers fall back to calling functions in the inferior when no bypass applies.
+# These calls are counted per (printer, method), and can be forbidden altogether
+# with `set boost-no-inferior-calls on`, e.g. on a live production process.
+#
+class No_Inferior_Calls_Parameter(gdb.Parameter):
+    """
+    Forbid the boost printers from calling functions in the inferior.
+
+    When on, a printer that would need an inferior function call fails
+    instead, naming the printer and the method that needs a bypass.
+    """
+    set_doc = 'Set whether boost printers may call functions in the inferior.'
+    show_doc = 'Show whether boost printers may call functions in the inferior.'
+
+    def __init__(self):
+        super(No_Inferior_Calls_Parameter, self).__init__(
+            'boost-no-inferior-calls', gdb.COMMAND_DATA, gdb.PARAM_BOOLEAN)
+        self.value = False
+
+    def get_set_string(self):
+        return ''
+
+    def get_show_string(self, svalue):
+        return 'Inferior function calls from boost printers are ' + ('forbidden.' if self.value else 'allowed.')
+
+
+no_inferior_calls = No_Inferior_Calls_Parameter()
+
+# number of inferior calls, by (printer name, method): since start, and during the last command
+inferior_call_counts = collections.Counter()
+last_command_call_counts = collections.Counter()
+_current_command_call_counts = collections.Counter()
+
+
+def _current_printer_name():
+    # the innermost method of a printer (or of one of its nested classes) on the stack
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        obj = frame.f_locals.get('self')
+        if obj is not None:
+            if hasattr(obj, 'printer_name'):
+                return obj.printer_name
+            if fallback is None and type(obj).__module__.startswith(__name__.rpartition('.')[0] + '.') \
+               and type(obj).__module__ != __name__:
+                fallback = getattr(type(obj), '__qualname__', type(obj).__name__)
+        frame = frame.f_back
+    return fallback or '<unknown printer>'
+
+
+def check_inferior_call(method, hint):
+    """
+    Account for an inferior call to `method`, about to be made by a printer.
+
+    Raises:
+      gdb.error, if inferior calls are forbidden. The message names the printer,
+      `method`, and `hint` (how to add a bypass).
+    """
+    key = (_current_printer_name(), method)
+    if no_inferior_calls.value:
+        raise gdb.error('boost-no-inferior-calls: printer [' + key[0] + '] needs to call ' + method
+                        + '; to bypass it, use: ' + hint)
+    inferior_call_counts[key] += 1
+    _current_command_call_counts[key] += 1
+
+
+def _on_before_prompt():
+    global last_command_call_counts, _current_command_call_counts
+    if _current_command_call_counts:
+        last_command_call_counts = _current_command_call_counts
+        _current_command_call_counts = collections.Counter()
+
+
+if hasattr(gdb, 'events') and hasattr(gdb.events, 'before_prompt'):
+    gdb.events.before_prompt.connect(_on_before_prompt)
+
+
+class Call_Stats_Command(gdb.Command):
+    """
+    Show the inferior function calls made by boost printers.
+
+    Usage: boost-call-stats [reset]
+    Lists the calls made by the last command that printed using them, then
+    all calls since gdb started (or since the last reset), by printer and method.
+    """
+
+    def __init__(self):
+        super(Call_Stats_Command, self).__init__('boost-call-stats', gdb.COMMAND_DATA)
+
+    def invoke(self, arg, from_tty):
+        global last_command_call_counts
+        if arg.strip() == 'reset':
+            inferior_call_counts.clear()
+            last_command_call_counts = collections.Counter()
+            return
+        elif arg.strip():
+            raise gdb.GdbError('boost-call-stats: unknown argument: ' + arg)
+        for title, counts in [('last command', last_command_call_counts), ('total', inferior_call_counts)]:
+            gdb.write('Inferior calls ({}): {}\n'.format(title, sum(counts.values())))
+            for (printer_name, method), count in counts.most_common():
+                gdb.write('  {:8} {}: {}\n'.format(count, printer_name, method))
+
+
+Call_Stats_Command()
+
+
 object_method = dict()
 
 
@@ -185,19 +472,20 @@ def call_object_method(v, f, *args):
     """
     assert isinstance(v, gdb.Value)
     assert isinstance(f, str)
+    facts = value_type_facts(v)
     # try the bypass function call first, by type name
-    key = str(get_basic_type(v.type)) + '::' + f
+    key = facts.type_name + '::' + f
     if key in object_method:
         return object_method[key](v, *args)
     # try the bypass function call first, by template name
-    key = template_name(v.type) + '::' + f
+    key = facts.template_name + '::' + f
     if key in object_method:
         return object_method[key](v, *args)
-    i = 0
+    check_inferior_call(key, 'py boost.object_method["' + key + '"] = <f>')
     args_to_eval = list()
-    for arg in args:
-        assert isinstance(arg, gdb.Value), 'extra argument %s not a gdb.Value' % i + 1
-        args_to_eval.append(to_eval(arg, '$_call_object_method_arg_%s' % i + 1))
+    for i, arg in enumerate(args, 1):
+        assert isinstance(arg, gdb.Value), 'extra argument %s not a gdb.Value' % i
+        args_to_eval.append(to_eval(arg, '$_call_object_method_arg_%s' % i))
     try:
         return parse_and_eval(to_eval(v, '$_call_object_method_arg_0') + '.' + f
                               + '(' + ', '.join(args_to_eval) + ')')
@@ -256,22 +544,24 @@ def call_static_method(t, f, *args):
     assert isinstance(t, gdb.Type)
     assert isinstance(f, str)
 
+    facts = type_facts(t)
     # first, try the type name bypass
-    if (str(t.strip_typedefs()), f) in static_method:
-        f_to_call = static_method[(str(t.strip_typedefs()), f)]
+    if (facts.stripped_name, f) in static_method:
+        f_to_call = static_method[(facts.stripped_name, f)]
         assert callable(f_to_call), '"f_to_call" not callable'
         return f_to_call(*args)
 
     # next, try the template name bypass
-    if (template_name(t), f) in static_method:
-        f_to_call = static_method[(template_name(t), f)]
+    if (facts.template_name, f) in static_method:
+        f_to_call = static_method[(facts.template_name, f)]
         assert callable(f_to_call), '"f_to_call" not callable'
         return f_to_call(t, *args)
 
+    check_inferior_call(facts.template_name + '::' + f,
+                        'py boost.static_method[("' + facts.stripped_name + '", "' + f + '")] = <f>')
     # construct argument list
-    i = 0
     args_to_eval = list()
-    for arg in args:
+    for i, arg in enumerate(args):
         assert isinstance(arg, gdb.Value), 'extra argument %s not a gdb.Value' % i
         args_to_eval.append(to_eval(arg, '$_call_static_method_arg_%s' % i))
     # eval in gdb
@@ -283,7 +573,7 @@ def call_static_method(t, f, *args):
         long_message(
             'call_static_method',
             '\n\tto bypass call with a python function <f>, use:\n' +
-            '\t  py boost.static_method[("' + str(t.strip_typedefs())
+            '\t  py boost.static_method[("' + facts.stripped_name
             + '", "' + f + '")] = <f>')
         raise gdb.error
 
@@ -301,6 +591,10 @@ def call_static_method(t, f, *args):
 #
 inner_type = dict()
 
+# Results of plain inner type access, keyed by (type_key(), inner typedef name).
+# Failed lookups are recorded as the name that was not found.
+_inner_types = Type_Cache(maxsize=4096)
+
 
 def get_inner_type(t, s):
     """
@@ -311,6 +605,8 @@ def get_inner_type(t, s):
     if value is a str, lookup the corresponding type and return it;
     if value is a function, call it with argument `t`, and return its value.
 
+    Otherwise, the outcome of the lookup (found or not) is cached per type.
+
     Args:
       `t`: a gdb.Type
       `s`: a string
@@ -324,26 +620,38 @@ def get_inner_type(t, s):
     assert isinstance(t, gdb.Type)
     assert isinstance(s, str)
 
-    v = None
-    # first, try the type name bypass
-    if (str(t.strip_typedefs()), s) in inner_type:
-        v = inner_type[(str(t.strip_typedefs()), s)]
-    # next, try the template name bypass
-    elif (template_name(t), s) in inner_type:
-        v = inner_type[(template_name(t), s)]
-
-    if isinstance(v, gdb.Type):
-        return v
-    elif isinstance(v, str):
-        return lookup_type(v)
-    elif callable(v):
-        return v(t)
-
-    # finally, try plain inner type access
-    inner_type_name = str(get_basic_type(t)) + '::' + s
+    facts = type_facts(t)
+    if inner_type:
+        v = None
+        # first, try the type name bypass
+        if (facts.stripped_name, s) in inner_type:
+            v = inner_type[(facts.stripped_name, s)]
+        # next, try the template name bypass
+        else:
+            v = inner_type.get((facts.template_name, s))
+
+        if isinstance(v, gdb.Type):
+            return v
+        elif isinstance(v, str):
+            return lookup_type(v)
+        elif callable(v):
+            return v(t)
+
+    # finally, try plain inner type access, remembering the outcome
+    key = facts.key
+    if key is not None:
+        result = _inner_types.get((key, s))
+        if isinstance(result, gdb.Type):
+            return result
+        elif result is not None:
+            # failed before, the message was already printed
+            raise gdb.error('get_inner_type: failed to find type: ' + result)
+    inner_type_name = facts.type_name + '::' + s
     try:
-        return lookup_type(inner_type_name).strip_typedefs()
+        result = lookup_type(inner_type_name).strip_typedefs()
     except gdb.error:
+        if key is not None:
+            _inner_types[(key, s)] = inner_type_name
         message('get_inner_type: failed to find type: ' + inner_type_name)
         long_message(
             'get_inner_type',
@@ -353,8 +661,11 @@ def get_inner_type(t, s):
             '\tsilently ignoring this flag.\n' +
             '\tAlternatively, to bypass this failure, add the result manually with:\n' +
             '\t  py boost.inner_type[("' +
-            str(get_basic_type(t)) + '", "' + s + '")] = <type>')
+            facts.type_name + '", "' + s + '")] = <type>')
         raise
+    if key is not None:
+        _inner_types[(key, s)] = result
+    return result
 
 
 #
@@ -385,27 +696,30 @@ def get_raw_ptr(p):
     if p.type.strip_typedefs().code == gdb.TYPE_CODE_PTR:
         return p
 
+    facts = value_type_facts(p)
     f = None
-    if str(p.type.strip_typedefs()) in raw_ptr:
-        f = raw_ptr[str(p.type.strip_typedefs())]
+    if facts.stripped_name in raw_ptr:
+        f = raw_ptr[facts.stripped_name]
         assert callable(f)
-    elif template_name(p.type) in raw_ptr:
-        f = raw_ptr[template_name(p.type)]
+    elif facts.template_name in raw_ptr:
+        f = raw_ptr[facts.template_name]
         assert callable(f)
 
     if f:
         return f(p)
 
+    check_inferior_call(facts.template_name + '::operator->',
+                        'py boost.raw_ptr["' + facts.stripped_name + '"] = <f>')
     p_str = to_eval(p, '$_get_raw_ptr_p')
     #save_value_as_variable(p, '$_p')
     try:
         return parse_and_eval(p_str + '.operator->()')
     except gdb.error:
-        message('get_raw_ptr: call to operator->() failed on type: ' + str(p.type.strip_typedefs()))
+        message('get_raw_ptr: call to operator->() failed on type: ' + facts.stripped_name)
         long_message(
             'get_raw_ptr',
             '\n\tto bypass this with python function <f>, add:\n' +
-            '\t  py boost.raw_ptr["' + str(p.type.strip_typedefs()) + '"] = <f>')
+            '\t  py boost.raw_ptr["' + facts.stripped_name + '"] = <f>')
         raise gdb.error
 
 
@@ -419,6 +733,231 @@ def print_ptr(p):
         return str(p)
 
 
+#
+# Direct reads of inferior memory, for printers that walk large structures
+# by address arithmetic instead of evaluating expressions. Reads go through
+# the page cache of memory.py.
+#
+_target_facts = Type_Cache()
+
+
+def target_byte_order():
+    """
+    Get the struct module byte order character of the target: '<' or '>'.
+    """
+    if 'byte_order' not in _target_facts:
+        endian = gdb.execute('show endian', False, True)
+        _target_facts['byte_order'] = '>' if 'big endian' in endian else '<'
+    return _target_facts['byte_order']
+
+
+def pointer_size():
+    """
+    Get the size in bytes of pointers of the target.
+    """
+    if 'pointer_size' not in _target_facts:
+        _target_facts['pointer_size'] = gdb.lookup_type('void').pointer().sizeof
+    return _target_facts['pointer_size']
+
+
+def read_pointer(addr, size=8):
+    """
+    Read the `size`-byte pointer (or unsigned integer) at address `addr` of the inferior.
+
+    Raises:
+      gdb.MemoryError, if the memory cannot be read.
+    """
+    fmt = target_byte_order() + ('Q' if size == 8 else 'I' if size == 4 else 'H')
+    return struct.unpack_from(fmt, read_memory(addr, size))[0]
+
+
+_field_offsets = Type_Cache()
+
+
+def field_offset(t, name):
+    """
+    Get the offset in bytes of field `name` (possibly inherited) in struct type `t`, and its type.
+
+    Returns None if `t` has no such field.
+    """
+    key = (type_key(t), name)
+    if key[0] is not None and key in _field_offsets:
+        return _field_offsets[key]
+    # the field of an object at a made-up address, which is never read
+    sentinel = 0x10000000
+    try:
+        field = gdb.Value(sentinel).cast(t.pointer()).dereference()[name]
+        result = (intptr(field.address) - sentinel, field.type)
+    except gdb.error:
+        result = None
+    if key[0] is not None:
+        _field_offsets[key] = result
+    return result
+
+
+_plain_types = Type_Cache()
+
+plain_type_codes = [gdb.TYPE_CODE_INT, gdb.TYPE_CODE_FLT, gdb.TYPE_CODE_ENUM, gdb.TYPE_CODE_PTR,
+                    gdb.TYPE_CODE_CHAR, gdb.TYPE_CODE_BOOL]
+
+
+def is_plain_type(t, sample=None):
+    """
+    Check if values of type `t` can be built from a copy of their bytes (see read_values()).
+
+    This is the case of scalars, and of structs and arrays of plain types without a pretty
+    printer: printing them needs neither their address nor the memory around them.
+
+    Whether a struct (or its fields) has a pretty printer is checked on `sample`, a value of
+    type `t` in inferior memory, since printers may need the address of the values they are
+    given. Without `sample`, structs and unions are not considered plain.
+    """
+    key = type_key(t)
+    if key is not None and key in _plain_types:
+        return _plain_types[key]
+    t = get_basic_type(t)
+    cache = True
+    if t.code in plain_type_codes:
+        result = True
+    elif t.code == gdb.TYPE_CODE_ARRAY:
+        element = sample[0] if sample is not None and t.range()[1] >= t.range()[0] else None
+        result = is_plain_type(t.target(), element)
+    elif t.code in [gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION]:
+        if sample is None:
+            result, cache = False, False
+        else:
+            try:
+                result = (can_build_values() and gdb.default_visualizer(sample) is None
+                          and all(is_plain_type(f.type, sample[f]) for f in t.fields() if hasattr(f, 'bitpos')))
+            except Exception:
+                # a printer failing on the sample cannot be trusted with a copy either
+                result = False
+    else:
+        result = False
+    if key is not None and cache:
+        _plain_types[key] = result
+    return result
+
+
+def can_build_values():
+    """Check if gdb can build values from bytes (gdb >= 8.3)"""
+    if 'build_values' not in _target_facts:
+        try:
+            gdb.Value(b'\0', lookup_type('char'))
+            _target_facts['build_values'] = True
+        except (TypeError, gdb.error):
+            _target_facts['build_values'] = False
+    return _target_facts['build_values']
+
+
+def read_values(addr, count, t, chunk_size=1 << 20):
+    """
+    Generate the `count` values of plain type `t` (see is_plain_type()) stored one after the other
+    at address `addr` of the inferior, as values that are not lvalues.
+
+    Memory is read in blocks of at most `chunk_size` bytes, and only as far as the values are used.
+
+    Raises:
+      gdb.MemoryError, if the memory cannot be read.
+    """
+    size = t.sizeof
+    per_chunk = max(1, chunk_size // size)
+    for first in xrange(0, count, per_chunk):
+        n = min(per_chunk, count - first)
+        data = read_memory_bulk(addr + first * size, n * size)
+        for idx in xrange(n):
+            yield gdb.Value(data[idx * size:(idx + 1) * size], t)
+
+
+def contiguous_values(start, count):
+    """
+    Generate the `count` values stored one after the other from pointer `start`.
+
+    Values of plain types are built from bulk memory reads when possible; others are,
+    and the rest of the values after a read error are, dereferenced one by one.
+    """
+    idx = 0
+    t = get_basic_type(start.type)
+    if count > 0 and t.code == gdb.TYPE_CODE_PTR and can_build_values() \
+       and is_plain_type(t.target(), start.dereference()):
+        try:
+            for value in read_values(intptr(start), count, t.target()):
+                yield value
+                idx += 1
+        except gdb.MemoryError:
+            pass
+    for idx in xrange(idx, count):
+        yield (start + idx).dereference()
+
+
+class Native_Arrays_Parameter(gdb.Parameter):
+    """
+    Let gdb print the elements of contiguous boost containers natively.
+
+    When on, array, small_vector, static_vector and iterator_range of elements
+    without a pretty printer are printed by gdb as a C array: much faster for large
+    containers, with repeated elements compressed. Their size and capacity are then
+    not shown.
+    """
+    set_doc = 'Set whether gdb prints the elements of contiguous boost containers natively.'
+    show_doc = 'Show whether gdb prints the elements of contiguous boost containers natively.'
+
+    def __init__(self):
+        super(Native_Arrays_Parameter, self).__init__('boost-native-arrays', gdb.COMMAND_DATA, gdb.PARAM_BOOLEAN)
+        self.value = False
+
+    def get_set_string(self):
+        return ''
+
+    def get_show_string(self, svalue):
+        return 'Native printing of contiguous boost containers is ' + svalue + '.'
+
+
+native_arrays = Native_Arrays_Parameter()
+
+
+def native_array(start, count):
+    """
+    Get the `count` values stored one after the other from pointer `start`, as one value of
+    C array type.
+
+    Returns None if `start` is None (the values are not in inferior memory), if there are no
+    values, or they have a pretty printer, or they do not fit in gdb 'max-value-size'.
+    """
+    if start is None or count <= 0 or get_basic_type(start.type).code != gdb.TYPE_CODE_PTR:
+        return None
+    element_type = start.type.target()
+    try:
+        max_size = gdb.parameter('max-value-size')
+    except RuntimeError:
+        # gdb < 7.12
+        max_size = None
+    if max_size is not None and count * element_type.sizeof > max_size:
+        return None
+    if gdb.default_visualizer(start.dereference()) is not None:
+        return None
+    return gdb.Value(intptr(start)).cast(element_type.array(count - 1).pointer()).dereference()
+
+
+class Native_Array_Printer(object):
+    """
+    Printer of a contiguous container whose elements are printed by gdb, as C array `array`.
+
+    Other attributes are those of the container printer, except children() and display_hint().
+    """
+    def __init__(self, printer, array):
+        self.printer = printer
+        self.array = array
+
+    def to_string(self):
+        return self.array
+
+    def __getattr__(self, name):
+        if name in ['children', 'display_hint']:
+            raise AttributeError(name)
+        return getattr(self.printer, name)
+
+
 #
 # Null value checker
 #
@@ -445,37 +984,59 @@ def is_null(p):
     if p.type.strip_typedefs().code == gdb.TYPE_CODE_PTR:
         return intptr(p) == 0
 
+    facts = value_type_facts(p)
     f = None
-    if str(p.type.strip_typedefs()) in null_dict:
-        f = null_dict[str(p.type.strip_typedefs())]
+    if facts.stripped_name in null_dict:
+        f = null_dict[facts.stripped_name]
         assert callable(f)
-    elif template_name(p.type) in null_dict:
-        f = null_dict[template_name(p.type)]
+    elif facts.template_name in null_dict:
+        f = null_dict[facts.template_name]
         assert callable(f)
 
     if f:
         return f(p)
 
-    message('is_null: cannot run is_null() on type: ' + str(p.type.strip_typedefs()))
+    message('is_null: cannot run is_null() on type: ' + facts.stripped_name)
     long_message(
         'is_null',
         '\n\tto bypass this with python function <f>, add:\n' +
-        '\t  py boost.null_dict["' + str(p.type.strip_typedefs()) + '"] = <f>')
+        '\t  py boost.null_dict["' + facts.stripped_name + '"] = <f>')
     raise gdb.error
 
 
-def add_to_dict(d, *keys):
+def add_to_dict(d, *keys, **kwargs):
     """
     Decorator that adds its argument object to  dict `d` under every key in `*keys`.
+
+    With `builtin=True`, as used by printer modules, keys already in `d` are left alone:
+    modules are imported lazily, possibly after the user added bypasses of their own.
     """
     assert isinstance(d, dict)
+    builtin = kwargs.pop('builtin', False)
+    assert not kwargs, 'unexpected arguments: ' + ', '.join(kwargs)
 
     def inner_decorator(obj):
         for k in keys:
-            d[k] = obj
+            if not builtin:
+                d[k] = obj
+            elif k not in d:
+                d[k] = obj
+                _builtin_bypasses[(id(d), k)] = obj
         return None
     return inner_decorator
 
+
+# Bypasses added with add_to_dict(..., builtin=True), keyed by (id of the dict, key)
+_builtin_bypasses = dict()
+
+
+def is_builtin_bypass(d, k):
+    """
+    Check if the entry of dict `d` under key `k` is the one a printer module added with
+    add_to_dict(..., builtin=True), and was not replaced by the user since.
+    """
+    return k in d and _builtin_bypasses.get((id(d), k)) is d[k]
+
 #
 # Convenience function for printing specific elements in containers.
 #
@@ -499,6 +1060,89 @@ class at_func(gdb.Function):
 _at = at_func()
 
 
+def registered_printer_gens():
+    """
+    Get all Printer_Gen objects registered with gdb: per objfile, per progspace and global.
+    """
+    printer_lists = [objfile.pretty_printers for objfile in gdb.objfiles()]
+    progspace = gdb.current_progspace()
+    if progspace is not None:
+        printer_lists.append(progspace.pretty_printers)
+    printer_lists.append(gdb.pretty_printers)
+    return [p for printer_list in printer_lists for p in printer_list if isinstance(p, Printer_Gen)]
+
+
+def get_printer(value):
+    """
+    Get the boost printer for gdb.Value `value`.
+
+    Raises:
+      gdb.GdbError, if no boost printer supports `value`.
+    """
+    for printer_gen in registered_printer_gens():
+        if printer_gen.name == 'boost' and printer_gen.enabled:
+            printer = printer_gen(value)
+            if printer is not None:
+                return printer
+    raise gdb.GdbError('no boost printer for type: ' + str(value.type))
+
+
+def split_expressions(arg):
+    """Split `arg` at the commas that are not within parentheses, brackets, braces or quotes"""
+    expressions, depth, quote, start = [], 0, None, 0
+    for idx, c in enumerate(arg):
+        if quote:
+            if c == quote and arg[idx - 1] != '\\':
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c in '([{':
+            depth += 1
+        elif c in ')]}':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            expressions.append(arg[start:idx].strip())
+            start = idx + 1
+    expressions.append(arg[start:].strip())
+    return [e for e in expressions if e]
+
+
+def parse_value_or_type(arg):
+    """
+    Evaluate `arg` as an expression. If that fails, look it up as a type name and
+    return a (lazy, never fetched) value of that type.
+    """
+    try:
+        return parse_and_eval(arg)
+    except gdb.error:
+        t = lookup_type(arg)
+    return gdb.Value(0).cast(t.pointer()).dereference()
+
+
+class Which_Printer_Command(gdb.Command):
+    """Show which boost printers are consulted to print a value or type.
+
+Usage: boost-which-printer EXPRESSION|TYPE
+
+For each registered top-level printer (e.g. boost, trivial), list the
+subprinters consulted for the type of EXPRESSION (or for TYPE), in order,
+and whether each one was selected, rejected or is disabled."""
+
+    def __init__(self):
+        super(Which_Printer_Command, self).__init__('boost-which-printer', gdb.COMMAND_DATA, gdb.COMPLETE_EXPRESSION)
+
+    def invoke(self, arg, from_tty):
+        if not arg:
+            raise gdb.GdbError('boost-which-printer: expression or type name required')
+        value = parse_value_or_type(arg)
+        for printer_gen in registered_printer_gens():
+            for line in printer_gen.explain(value):
+                gdb.write(line + '\n')
+
+
+Which_Printer_Command()
+
+
 def unwind_references(value):
     """Convert reference (or reference chain) to actual value"""
     # gdb.TYPE_CODE_RVALUE_REF is also available in recent gdb versions
@@ -512,26 +1156,58 @@ def reinterpret_cast(value, target_type):
 
 
 class GDB_Value_Wrapper(gdb.Value):
-    """Wrapper class for gdb.Value"""
+    """
+    Wrapper class for gdb.Value.
+
+    The attributes `qualifiers`, `basic_type`, `type_name` and `template_name` are
+    computed on first access, from Type_Facts shared by all values of the same type.
+    Printers are free to add their own attributes.
+    """
     def __init__(self, value):
         # In Python 3 simply deriving from gdb.Value will generate a __dict__ attribute.
         # In Python 2 we add a __dict__ attribute explicitly.
         if have_python_2:
             self.__dict__ = {}
         gdb.Value.__init__(value)
-        self.qualifiers = get_type_qualifiers(value.type)
-        self.basic_type = get_basic_type(value.type)
-        self.type_name = str(self.basic_type)
-        self.template_name = template_name(self.basic_type)
+
+    @lazy_attribute
+    def type_facts(self):
+        return type_facts(self.type)
+
+    @lazy_attribute
+    def qualifiers(self):
+        return self.type_facts.qualifiers
+
+    @lazy_attribute
+    def basic_type(self):
+        return self.type_facts.basic_type
+
+    @lazy_attribute
+    def type_name(self):
+        return self.type_facts.type_name
+
+    @lazy_attribute
+    def template_name(self):
+        return self.type_facts.template_name
 
 
 class Printer_Gen(object):
     """
     Top-level printer generator.
+
+    The subprinters to try for a given type are resolved once and kept in `type_cache`,
+    including the (common) case where no subprinter applies.
+
+    If `objfile` is given, only values whose type belongs to that objfile are printed.
+
+    If `boost_version` is given, this is a 'boost' printer: printer modules that are not
+    imported yet are imported when one of their template names is first looked up, and
+    their printers supporting `boost_version` are added (see import_printer_module()).
     """
     class SubPrinter_Gen(object):
-        def __init__(self, Printer, tn=str()):
+        def __init__(self, Printer, tn=str(), parent=None):
             self.Printer = Printer
+            self.parent = parent
             # set printer_name
             assert tn != '' or hasattr(Printer, 'printer_name')
             if tn != '':
@@ -540,31 +1216,62 @@ class Printer_Gen(object):
                 self.name = Printer.printer_name
             # set enabled
             if hasattr(Printer, 'enabled'):
-                self.enabled = Printer.enabled
+                self._enabled = Printer.enabled
             else:
-                self.enabled = True
+                self._enabled = True
+            # a supports() that only looks at the type can be checked once per type
+            self.type_only = not hasattr(Printer, 'supports') or getattr(Printer, 'supports_type_only', False)
 
-        def __call__(self, v):
-            if not self.enabled:
-                return None
-            if hasattr(self.Printer, 'supports') and not self.Printer.supports(v):
-                return None
+        @property
+        def enabled(self):
+            return self._enabled
+
+        @enabled.setter
+        def enabled(self, flag):
+            # set by `enable/disable pretty-printer`
+            self._enabled = flag
+            if self.parent is not None:
+                self.parent.type_cache.clear()
+
+        def supports(self, v):
+            return not hasattr(self.Printer, 'supports') or self.Printer.supports(v)
+
+        def instantiate(self, v):
             if hasattr(self.Printer, 'transform') and callable(self.Printer.transform):
                 tv = self.Printer.transform(v)
                 if type(tv) == gdb.Value:
                     p = gdb.default_visualizer(tv)
                     if p:
                         return p
-                return self.Printer(tv)
+                printer = self.Printer(tv)
             else:
-                return self.Printer(v)
+                printer = self.Printer(v)
+            # both dispatch paths of Printer_Gen come through here
+            if native_arrays.value and hasattr(printer, 'native_value'):
+                array = printer.native_value()
+                if array is not None:
+                    return Native_Array_Printer(printer, array)
+            return printer
+
+        def __call__(self, v):
+            if not self.enabled:
+                return None
+            if not self.supports(v):
+                return None
+            return self.instantiate(v)
 
-    def __init__(self, name):
+    def __init__(self, name, objfile=None, boost_version=None):
         self.name = name
+        self.objfile = objfile
+        self.boost_version = boost_version
+        # number of entries of boost_printer_list already considered
+        self.loaded_count = 0
         self.enabled = True
-        self.subprinters = list()
+        self._subprinters = list()
         self.template_name_dict = collections.defaultdict(list)
+        self.template_namespace_dict = collections.defaultdict(list)
         self.no_template_name_list = list()
+        self.type_cache = Type_Cache()
 
     def add(self, Printer, tn=str()):
         if not hasattr(Printer, 'supports') and not hasattr(Printer, 'template_name') and tn == '':
@@ -582,26 +1289,161 @@ class Printer_Gen(object):
         else:
             message('cannot import printer [' + Printer.printer_name + ']: template_name has type=' + str(type(Printer.template_name)))
             return
+        # get list of template namespaces, used when there is no template name
+        namespace_list = getattr(Printer, 'template_namespace', list())
+        if type(namespace_list) == str:
+            namespace_list = [namespace_list]
         # create new printer
-        p = Printer_Gen.SubPrinter_Gen(Printer, tn)
+        p = Printer_Gen.SubPrinter_Gen(Printer, tn, self)
         # add it to subprinters
-        self.subprinters.append(p)
-        # add it to template_name_dict
+        self._subprinters.append(p)
+        # add it to template_name_dict, template_namespace_dict, or no_template_name_list
         if name_list:
             for template_name in name_list:
                 self.template_name_dict[template_name].append(p)
+        elif namespace_list:
+            for namespace in namespace_list:
+                self.template_namespace_dict[namespace].append(p)
         else:
             self.no_template_name_list.append(p)
+        self.type_cache.clear()
+
+    @property
+    def subprinters(self):
+        # listed, enabled and disabled by `info/enable/disable pretty-printer`, which must
+        # see the subprinters of the printer modules not imported yet
+        if self.boost_version is not None and _lazy_printer_modules:
+            import_all_printer_modules()
+        return self._subprinters
+
+    # number of first base classes followed to find printers by template namespace
+    max_base_depth = 5
+
+    def get_namespace_subprinter_gens(self, tn):
+        """
+        Get the subprinter generators indexed by an enclosing namespace of template name `tn`,
+        innermost first.
+        """
+        if self.boost_version is not None and (lazy_template_names or lazy_template_namespaces):
+            import_printer_modules_for(tn)
+        result = list()
+        scopes = tn.split('::')[:-1]
+        while scopes:
+            result.extend(self.template_namespace_dict.get('::'.join(scopes), list()))
+            scopes.pop()
+        return result
+
+    def get_subprinter_gens(self, tn, t=None):
+        """
+        Get the subprinter generators to consult, in order, for template name `tn`.
+
+        If the basic type `t` is given, the subprinters indexed by the namespace of its first
+        base class (then of the first base of that, and so on, up to `max_base_depth` levels)
+        are consulted last, so that e.g. `struct MySet : boost::intrusive::set<...>` is still
+        printed by the intrusive set printer. Other base classes are not followed.
+        """
+        if self.boost_version is not None and (lazy_template_names or lazy_template_namespaces):
+            import_printer_modules_for(tn)
+        if tn in self.template_name_dict:
+            return self.template_name_dict[tn]
+        result = self.get_namespace_subprinter_gens(tn)
+        base_result = list()
+        for _ in range(self.max_base_depth if t is not None else 0):
+            if t.code != gdb.TYPE_CODE_STRUCT:
+                break
+            fields = t.fields()
+            if not fields or not fields[0].is_base_class:
+                break
+            t = get_basic_type(fields[0].type)
+            for subprinter_gen in self.get_namespace_subprinter_gens(template_name(t)):
+                if subprinter_gen not in result and subprinter_gen not in base_result:
+                    base_result.append(subprinter_gen)
+        return result + self.no_template_name_list + base_result
+
+    def get_candidates(self, v):
+        """
+        Resolve the subprinters to try on values with the type of `v`.
+
+        Returns a tuple of (subprinter_gen, checked) pairs. Subprinters whose
+        supports() only depends on the type are checked here (checked=True), and
+        resolution stops at the first one that accepts the type. Other subprinters
+        must still be asked for every value.
+        """
+        candidates = list()
+        for subprinter_gen in self.get_subprinter_gens(v.template_name, v.basic_type):
+            if not subprinter_gen.enabled:
+                continue
+            if not subprinter_gen.type_only:
+                candidates.append((subprinter_gen, False))
+            elif subprinter_gen.supports(v):
+                candidates.append((subprinter_gen, True))
+                break
+        return tuple(candidates)
+
+    def load_boost_printers(self):
+        """
+        Add the printers supporting `boost_version` that were added to boost_printer_list since last time.
+        """
+        for printer in boost_printer_list[self.loaded_count:]:
+            if printer.min_supported_version <= self.boost_version <= printer.max_supported_version:
+                self.add(printer)
+        self.loaded_count = len(boost_printer_list)
 
     def __call__(self, value):
+        if self.objfile is not None:
+            # the type may belong to another objfile, with printers of its own: check this
+            # before type_key(), which formats the type name, for every objfile
+            t = value.type.strip_typedefs()
+            if t.code == gdb.TYPE_CODE_REF:
+                t = t.target().strip_typedefs()
+            objfile = getattr(t, 'objfile', None)
+            if objfile is not None and objfile is not self.objfile:
+                return None
+        key = type_key(value.type)
+        candidates = self.type_cache.get(key) if key is not None else None
+        if not candidates and candidates is not None:
+            return None
         v = GDB_Value_Wrapper(value)
-        subprinter_generators = self.template_name_dict.get(v.template_name, self.no_template_name_list)
-        for subprinter_gen in subprinter_generators:
-            printer = subprinter_gen(v)
+        if key is not None:
+            v.type_facts = type_facts(value.type, key)
+        if candidates is None:
+            candidates = self.get_candidates(v)
+            if key is not None:
+                self.type_cache[key] = candidates
+        for subprinter_gen, checked in candidates:
+            printer = subprinter_gen.instantiate(v) if checked else subprinter_gen(v)
             if printer is not None:
                 return printer
         return None
 
+    def explain(self, value):
+        """
+        Describe how a subprinter is selected for gdb.Value `value`.
+
+        Returns a list of lines, naming every subprinter consulted and its verdict.
+        """
+        v = GDB_Value_Wrapper(value)
+        key = type_key(value.type)
+        lines = ['%s: type [%s], template name [%s]%s' % (
+            self.name, v.type_name, v.template_name,
+            ', resolution cached' if key is not None and key in self.type_cache else '')]
+        subprinter_gens = self.get_subprinter_gens(v.template_name, v.basic_type)
+        if not subprinter_gens:
+            lines.append('  no subprinters consulted')
+        for subprinter_gen in subprinter_gens:
+            if not subprinter_gen.enabled:
+                verdict = 'disabled'
+            elif not hasattr(subprinter_gen.Printer, 'supports'):
+                verdict = 'selected by template name'
+            elif subprinter_gen.supports(v):
+                verdict = 'selected by supports()'
+            else:
+                verdict = 'rejected by supports()'
+            lines.append('  %s: %s' % (subprinter_gen.name, verdict))
+            if verdict.startswith('selected'):
+                break
+        return lines
+
 
 class Type_Printer_Gen:
     """
@@ -622,23 +1464,191 @@ boost_printer_list = []
 trivial_printer_list = []
 
 
-def register_printers(obj=None, boost_version=None):
+def make_boost_printer_gen(boost_version, objfile=None):
     """
-    Register top-level printers 'boost' and 'trivial' with objfile `obj`.
+    Create top-level printer 'boost' with the printers supporting `boost_version`.
+
+    Returns None if there are no such printers.
     """
-    if boost_version is None:
+    supported = any(printer.min_supported_version <= boost_version <= printer.max_supported_version
+                    for printer in boost_printer_list)
+    if not supported and (lazy_template_names or lazy_template_namespaces):
+        # the printers of modules not imported yet are unknown
+        supported = first_supported_boost_version <= boost_version <= last_supported_boost_version
+    if not supported:
+        message('No boost printers are available for boost version {}.{}.{}!'.format(*boost_version))
+        return None
+    boost_printer_gen = Printer_Gen('boost', objfile, boost_version)
+    boost_printer_gen.load_boost_printers()
+    _boost_printer_gens[id(boost_printer_gen)] = boost_printer_gen
+    return boost_printer_gen
+
+
+#
+# Lazily imported printer modules.
+#
+# Modules registered with add_lazy_printer_module() are only imported when a type with one
+# of their template names (or in one of their template namespaces) is first looked up by a
+# 'boost' printer. The time spent importing each module is kept in printer_module_import_times.
+#
+lazy_template_names = collections.defaultdict(list)
+lazy_template_namespaces = collections.defaultdict(list)
+printer_module_import_times = collections.OrderedDict()
+printer_module_manifest = collections.OrderedDict()
+_lazy_printer_modules = list()
+_boost_printer_gens = weakref.WeakValueDictionary()
+
+
+def add_lazy_printer_module(module_name, template_names, template_namespaces=()):
+    """
+    Register printer module `module_name` (relative to this package), to be imported on first
+    use of one of `template_names` or `template_namespaces`.
+
+    These must list the template names and namespaces of all printers in the module.
+    """
+    for template_name in template_names:
+        lazy_template_names[template_name].append(module_name)
+    for namespace in template_namespaces:
+        lazy_template_namespaces[namespace].append(module_name)
+    printer_module_manifest[module_name] = (list(template_names), list(template_namespaces))
+    _lazy_printer_modules.append(module_name)
+
+
+def _forget_lazy_printer_module(module_name):
+    for table in (lazy_template_names, lazy_template_namespaces):
+        for key in list(table):
+            table[key] = [m for m in table[key] if m != module_name]
+            if not table[key]:
+                del table[key]
+    _lazy_printer_modules.remove(module_name)
+
+
+def import_printer_module(module_name):
+    """
+    Import lazy printer module `module_name`, and add its printers to the live 'boost' printers.
+    """
+    if module_name not in _lazy_printer_modules:
+        return
+    start = time.time()
+    try:
+        importlib.import_module('.' + module_name, __name__.rpartition('.')[0])
+    except Exception as e:
+        message('cannot import printer module [' + module_name + ']: ' + str(e))
+    finally:
+        # do not retry a module that failed to import on every lookup
+        _forget_lazy_printer_module(module_name)
+        printer_module_import_times[module_name] = time.time() - start
+    for boost_printer_gen in list(_boost_printer_gens.values()):
+        boost_printer_gen.load_boost_printers()
+
+
+def import_printer_modules_for(tn):
+    """
+    Import the lazy printer modules with printers for template name `tn`.
+    """
+    module_names = list(lazy_template_names.get(tn, list()))
+    scopes = tn.split('::')[:-1]
+    while scopes:
+        module_names.extend(lazy_template_namespaces.get('::'.join(scopes), list()))
+        scopes.pop()
+    for module_name in module_names:
+        import_printer_module(module_name)
+
+
+def import_all_printer_modules():
+    """
+    Import all lazy printer modules now.
+    """
+    for module_name in list(_lazy_printer_modules):
+        import_printer_module(module_name)
+
+
+class Printer_Modules_Command(gdb.Command):
+    """
+    List the boost printer modules, with the time it took to import them.
+
+    Usage: boost-printer-modules
+    Modules not imported yet are listed as pending; they get imported when
+    one of their types is printed.
+    """
+
+    def __init__(self):
+        super(Printer_Modules_Command, self).__init__('boost-printer-modules', gdb.COMMAND_DATA)
+
+    def invoke(self, arg, from_tty):
+        for module_name, seconds in printer_module_import_times.items():
+            gdb.write('{}: imported in {:.1f} ms\n'.format(module_name, seconds * 1000))
+        for module_name in _lazy_printer_modules:
+            gdb.write('{}: pending\n'.format(module_name))
+
+
+Printer_Modules_Command()
+
+
+class _Per_Objfile(object):
+    # boost version for objfiles without macro information
+    boost_version = None
+    connected = False
+
+
+def _get_per_objfile_fallback_version():
+    if _Per_Objfile.boost_version is None:
         message('Detecting boost_version... ')
-        boost_version = detect_boost_version()
-        message('Detected boost version: {}.{}.{}'.format(*boost_version))
-    supported_printers = [printer for printer in boost_printer_list
-                          if printer.min_supported_version <= boost_version <= printer.max_supported_version]
-    if supported_printers:
-        boost_printer_gen = Printer_Gen('boost')
-        for printer in supported_printers:
-            boost_printer_gen.add(printer)
-        gdb.printing.register_pretty_printer(obj, boost_printer_gen, replace=True)
+        _Per_Objfile.boost_version = detect_boost_version()
+        message('Detected boost version: {}.{}.{}'.format(*_Per_Objfile.boost_version))
+    return _Per_Objfile.boost_version
+
+
+def register_objfile_printers(objfile):
+    """
+    Register top-level printer 'boost' with `objfile`, for the boost version it was built with.
+
+    The version is read from the BOOST_VERSION macro in the objfile debug info (present
+    when compiling with -g3). If there is no macro information, the version passed to
+    register_printers(per_objfile=True) is used, or else the detected one. Objfiles without
+    debug info, or whose debug info does not mention boost at all, are skipped; when that
+    cannot be told (see scan_object_file()), the printers are registered.
+    """
+    if not objfile.is_valid() or objfile.filename is None:
+        return
+    uses_boost, boost_version = scan_object_file(objfile.filename)
+    if not uses_boost:
+        return
+    if boost_version is None:
+        boost_version = _get_per_objfile_fallback_version()
+    boost_printer_gen = make_boost_printer_gen(boost_version, objfile)
+    if boost_printer_gen is not None:
+        gdb.printing.register_pretty_printer(objfile, boost_printer_gen, replace=True)
+
+
+def _on_new_objfile(event):
+    register_objfile_printers(event.new_objfile)
+
+
+def register_printers(obj=None, boost_version=None, per_objfile=False):
+    """
+    Register top-level printers 'boost' and 'trivial', and the boost xmethods, with objfile `obj`.
+
+    With `per_objfile`, printer 'boost' is instead registered separately with every
+    objfile using boost, as objfiles get loaded (see register_objfile_printers()). Each
+    objfile then only gets the printers for its own boost version, and `boost_version`
+    is only used for objfiles without macro information.
+    """
+    if per_objfile:
+        _Per_Objfile.boost_version = boost_version
+        if not _Per_Objfile.connected:
+            gdb.events.new_objfile.connect(_on_new_objfile)
+            _Per_Objfile.connected = True
+        for objfile in gdb.objfiles():
+            register_objfile_printers(objfile)
     else:
-        message('No boost printers are available for boost version {}.{}.{}!'.format(*boost_version))
+        if boost_version is None:
+            message('Detecting boost_version... ')
+            boost_version = detect_boost_version()
+            message('Detected boost version: {}.{}.{}'.format(*boost_version))
+        boost_printer_gen = make_boost_printer_gen(boost_version)
+        if boost_printer_gen is not None:
+            gdb.printing.register_pretty_printer(obj, boost_printer_gen, replace=True)
 
     trivial_printer_gen = Printer_Gen('trivial')
     for printer in trivial_printer_list:
@@ -648,6 +1658,36 @@ def register_printers(obj=None, boost_version=None):
     for tp in type_printer_list:
         gdb.types.register_type_printer(obj, tp)
 
+    # imported here, as the xmethods module itself needs this one
+    from .xmethods import register_xmethods
+    register_xmethods(obj)
+
+
+class Detect_Version_Command(gdb.Command):
+    """Detect the boost version again, ignoring and refreshing the cached result.
+
+Usage: boost-detect-version [auto|header|compile]
+
+register_printers() without an explicit boost_version reads BOOST_VERSION from
+boost/version.hpp, found through CPPFLAGS and the system include directories.
+When that fails, it compiles a test program, and caches the result on disk,
+keyed by CXX and CPPFLAGS. Use this command when the cached version went
+stale, then register the printers again. The optional argument selects the
+detection method (default: auto)."""
+
+    def __init__(self):
+        super(Detect_Version_Command, self).__init__('boost-detect-version', gdb.COMMAND_SUPPORT, gdb.COMPLETE_NONE)
+
+    def invoke(self, arg, from_tty):
+        method = arg.strip() or 'auto'
+        if method not in ('auto', 'header', 'compile'):
+            raise gdb.GdbError('boost-detect-version: unknown method: ' + method)
+        boost_version = detect_boost_version(use_cache=False, method=method)
+        gdb.write('Detected boost version: {}.{}.{}\n'.format(*boost_version))
+
+
+Detect_Version_Command()
+
 
 def add_printer(p):
     """
@@ -777,5 +1817,6 @@ multi_index_selector = dict()
 #
 options = {'hide_intrusive_hooks': True}
 
-# Latest boost currently supported by printers
+# Oldest and latest boost currently supported by printers
+first_supported_boost_version = (1, 40, 0)
 last_supported_boost_version = (1, 73, 0)
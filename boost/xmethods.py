@@ -0,0 +1,354 @@
+# encoding: utf-8
+
+#
+# Xmethods for Boost containers
+#
+# Calls like `p v.size()` or `p m.find(3)` normally need a function call in the
+# inferior, which is slow, impossible on core files, and fails when the method was
+# inlined. The xmethods below compute the result from memory instead, using the
+# layout knowledge of the pretty printers: the printer for the object is found
+# through the registered 'boost' printer, and asked for the size or the elements.
+#
+# Smart pointers and optional have get(), operator* and operator-> (and the
+# reference counts, for shared_ptr), so that `p sp->field` or `p *opt` work in
+# breakpoint conditions without resuming the inferior.
+#
+# find() returns a pointer to the element found (null if there is none) rather than
+# an iterator, so `p *m.find(k)` and `p m.find(k)->second` work. Lookups by key are
+# only provided for keys of scalar types (integers, floats, enums, pointers), which
+# can be compared without calling operator< or operator== in the inferior. When gdb
+# does not know the element type of a map (its value_type typedef was eliminated from
+# the debug info), find() is called in the inferior as usual.
+#
+
+from __future__ import print_function, absolute_import, division
+import gdb
+from .utils import *
+from .flat_find import flat_find
+
+try:
+    import gdb.xmethod
+    have_xmethods = True
+except ImportError:
+    # gdb < 7.9
+    have_xmethods = False
+
+scalar_type_codes = [gdb.TYPE_CODE_INT, gdb.TYPE_CODE_FLT, gdb.TYPE_CODE_ENUM, gdb.TYPE_CODE_PTR,
+                     gdb.TYPE_CODE_CHAR, gdb.TYPE_CODE_BOOL]
+
+
+def get_size_type():
+    for name in ['std::size_t', 'size_t', 'unsigned long']:
+        try:
+            return lookup_type(name)
+        except gdb.error:
+            pass
+
+
+def is_scalar(t):
+    return get_basic_type(t).code in scalar_type_codes
+
+
+def to_python(v):
+    """Convert a gdb.Value of scalar type into a python number that compares like it"""
+    return float(v) if get_basic_type(v.type).code == gdb.TYPE_CODE_FLT else intptr(v)
+
+
+def check_index(printer, idx):
+    idx = int(idx)
+    size = printer.get_size()
+    if not 0 <= idx < size:
+        raise gdb.GdbError('index {} out of range (size {})'.format(idx, size))
+    return idx
+
+
+def size_of(printer):
+    if hasattr(printer, 'get_size'):
+        return int(printer.get_size())
+    if hasattr(printer, 'size'):
+        return int(printer.size())
+    if hasattr(printer, 'node_count'):
+        return printer.node_count
+    # containers that do not store their size
+    return sum(1 for _ in printer.children())
+
+
+def is_empty(printer):
+    if hasattr(printer, 'get_size') or hasattr(printer, 'size') or hasattr(printer, 'node_count'):
+        return size_of(printer) == 0
+    for _ in printer.children():
+        return False
+    return True
+
+
+def find_unsorted(items, key, get_key):
+    key = to_python(key)
+    for item in items:
+        if to_python(get_key(item)) == key:
+            return item
+    return None
+
+
+def get_element_type(t, is_set):
+    """
+    Get the type of the elements of set or map type `t`, or None if gdb does not know it.
+    """
+    if is_set:
+        # value_type is the key type
+        return t.template_argument(0)
+    try:
+        return get_inner_type(t, 'value_type')
+    except gdb.error:
+        # the typedef was eliminated from the debug info
+        return None
+
+
+def element_pointer(element, element_type):
+    if element is None:
+        return gdb.Value(0).cast(element_type.pointer())
+    return element.address
+
+
+pointer_or_reference_codes = [gdb.TYPE_CODE_PTR, gdb.TYPE_CODE_REF] + (
+    [gdb.TYPE_CODE_RVALUE_REF] if hasattr(gdb, 'TYPE_CODE_RVALUE_REF') else [])
+
+
+if have_xmethods:
+
+    class Boost_XMethod_Worker(gdb.xmethod.XMethodWorker):
+        """
+        Worker computing a method of a boost object from memory.
+
+        `f` is called with the printer of the object, then the method arguments.
+        """
+        def __init__(self, f, result_type, arg_types=None):
+            self.f = f
+            self.result_type = result_type
+            self.arg_types = arg_types
+
+        def get_arg_types(self):
+            return self.arg_types
+
+        def get_result_type(self, obj, *args):
+            return self.result_type
+
+        def __call__(self, obj, *args):
+            # `this` is a pointer when the method is called through ->
+            if obj.type.strip_typedefs().code in pointer_or_reference_codes:
+                obj = obj.referenced_value()
+            return self.f(get_printer(obj), *args)
+
+    class Boost_XMethod(gdb.xmethod.XMethod):
+        """
+        Xmethods of the objects with one of `template_names`.
+
+        `methods` maps method names to functions that take the object type and return
+        a Boost_XMethod_Worker, or None if the method cannot be computed for that type.
+        """
+        def __init__(self, name, template_names, methods):
+            super(Boost_XMethod, self).__init__(name)
+            self.template_names = template_names
+            self.methods = methods
+
+    class Boost_XMethod_Matcher(gdb.xmethod.XMethodMatcher):
+        def __init__(self):
+            super(Boost_XMethod_Matcher, self).__init__('boost')
+            self.methods = list(xmethod_list)
+
+        def match(self, class_type, method_name):
+            tn = template_name(class_type)
+            workers = list()
+            for xmethod in self.methods:
+                if xmethod.enabled and tn in xmethod.template_names and method_name in xmethod.methods:
+                    try:
+                        worker = xmethod.methods[method_name](get_basic_type(class_type))
+                    except gdb.error:
+                        # e.g. a type missing from the debug info: the method is called as usual
+                        worker = None
+                    if worker is not None:
+                        workers.append(worker)
+            return workers
+
+    #
+    # Methods shared by several containers
+    #
+    def size_worker(t):
+        return Boost_XMethod_Worker(lambda p: gdb.Value(size_of(p)).cast(get_size_type()), get_size_type())
+
+    def empty_worker(t):
+        return Boost_XMethod_Worker(lambda p: gdb.Value(is_empty(p)).cast(lookup_type('bool')), lookup_type('bool'))
+
+    def index_worker(t):
+        # no bounds check, like operator[]
+        return Boost_XMethod_Worker(lambda p, idx: p.get_element(int(idx)),
+                                    t.template_argument(0), [get_size_type()])
+
+    def at_worker(t):
+        return Boost_XMethod_Worker(lambda p, idx: p.get_element(check_index(p, idx)),
+                                    t.template_argument(0), [get_size_type()])
+
+    sequence_methods = {'size': size_worker, 'empty': empty_worker,
+                        'operator[]': index_worker, 'at': at_worker}
+
+    #
+    # Flat containers: elements sorted by key, found by binary search
+    #
+    def flat_find_worker(compare_index):
+        def make_worker(t):
+            key_type = t.template_argument(0)
+            if not is_scalar(key_type) or template_name(t.template_argument(compare_index)) != 'std::less':
+                return None
+            element_type = get_element_type(t, compare_index == 1)
+            if element_type is None:
+                return None
+
+            def f(p, key):
+                found = flat_find(p, key)
+                return element_pointer(found[1] if found else None, element_type)
+            return Boost_XMethod_Worker(f, element_type.pointer(), [key_type])
+        return make_worker
+
+    def flat_map_at_worker(t):
+        key_type = t.template_argument(0)
+        if not is_scalar(key_type) or template_name(t.template_argument(2)) != 'std::less':
+            return None
+
+        def f(p, key):
+            found = flat_find(p, key)
+            if found is None:
+                raise gdb.GdbError('key {} not found'.format(key))
+            return found[1]['second']
+        return Boost_XMethod_Worker(f, t.template_argument(1), [key_type])
+
+    #
+    # Unordered containers: the hash function cannot be run, so find() is a linear scan
+    #
+    def unordered_find_worker(get_key, is_set):
+        def make_worker(t):
+            key_type = t.template_argument(0)
+            if not is_scalar(key_type):
+                return None
+            element_type = get_element_type(t, is_set)
+            if element_type is None:
+                return None
+            return Boost_XMethod_Worker(
+                lambda p, key: element_pointer(find_unsorted(p.stored_items(), key, get_key), element_type),
+                element_type.pointer(), [key_type])
+        return make_worker
+
+    def unordered_map_at_worker(t):
+        key_type = t.template_argument(0)
+        if not is_scalar(key_type):
+            return None
+
+        def f(p, key):
+            item = find_unsorted(p.stored_items(), key, lambda i: i['first'])
+            if item is None:
+                raise gdb.GdbError('key {} not found'.format(key))
+            return item['second']
+        return Boost_XMethod_Worker(f, t.template_argument(1), [key_type])
+
+    #
+    # Smart pointers and optional
+    #
+    def pointer_of(p):
+        return p.value['px']
+
+    def dereference(ptr):
+        if ptr == 0:
+            raise gdb.GdbError('dereferencing a null pointer')
+        return ptr.dereference()
+
+    pointer_methods = {
+        'get': lambda t: Boost_XMethod_Worker(pointer_of, t.template_argument(0).pointer()),
+        'operator->': lambda t: Boost_XMethod_Worker(pointer_of, t.template_argument(0).pointer()),
+        'operator*': lambda t: Boost_XMethod_Worker(lambda p: dereference(pointer_of(p)), t.template_argument(0)),
+    }
+
+    def use_count(p):
+        count = p.get_counts()[0]
+        if count == '?':
+            raise gdb.GdbError('cannot read the use count of: ' + str(p.value.type))
+        return count
+
+    def count_worker(f, result_type_name):
+        return lambda t: Boost_XMethod_Worker(lambda p: gdb.Value(f(p)).cast(lookup_type(result_type_name)),
+                                              lookup_type(result_type_name))
+
+    shared_ptr_methods = dict(pointer_methods, **{
+        'use_count': count_worker(use_count, 'long'),
+        'unique': count_worker(lambda p: use_count(p) == 1, 'bool'),
+    })
+    weak_ptr_methods = {
+        'use_count': count_worker(use_count, 'long'),
+        'expired': count_worker(lambda p: use_count(p) == 0, 'bool'),
+    }
+
+    def optional_value(p):
+        value = p.get_value()
+        if value is None:
+            raise gdb.GdbError('boost::optional is not initialized')
+        return value
+
+    def optional_pointer(p):
+        value = p.get_value()
+        if value is None:
+            return gdb.Value(0).cast(get_basic_type(p.value.basic_type.template_argument(0)).pointer())
+        return value.address
+
+    optional_methods = {
+        'get': lambda t: Boost_XMethod_Worker(optional_value, t.template_argument(0)),
+        'value': lambda t: Boost_XMethod_Worker(optional_value, t.template_argument(0)),
+        'operator*': lambda t: Boost_XMethod_Worker(optional_value, t.template_argument(0)),
+        'operator->': lambda t: Boost_XMethod_Worker(optional_pointer, t.template_argument(0).pointer()),
+        'get_ptr': lambda t: Boost_XMethod_Worker(optional_pointer, t.template_argument(0).pointer()),
+        'is_initialized': count_worker(lambda p: p.get_value() is not None, 'bool'),
+        'has_value': count_worker(lambda p: p.get_value() is not None, 'bool'),
+    }
+
+    intrusive_template_names = ['boost::intrusive::' + name for name in [
+        'list', 'slist',
+        'set', 'multiset', 'rbtree', 'avl_set', 'avl_multiset', 'avltree', 'splay_set', 'splay_multiset',
+        'splaytree', 'sg_set', 'sg_multiset', 'sgtree', 'treap_set', 'treap_multiset', 'treap',
+        'bs_set', 'bs_multiset', 'bstree']]
+
+    xmethod_list = [
+        Boost_XMethod('boost::array', ['boost::array'], sequence_methods),
+        Boost_XMethod('boost::circular_buffer', ['boost::circular_buffer'], sequence_methods),
+        Boost_XMethod('boost::container::small_vector',
+                      ['boost::container::small_vector', 'boost::container::small_vector_base'], sequence_methods),
+        Boost_XMethod('boost::container::static_vector', ['boost::container::static_vector'], sequence_methods),
+        Boost_XMethod('boost::container::flat_set', ['boost::container::flat_set'], {
+            'size': size_worker, 'empty': empty_worker,
+            'find': flat_find_worker(1)}),
+        Boost_XMethod('boost::container::flat_map', ['boost::container::flat_map'], {
+            'size': size_worker, 'empty': empty_worker,
+            'find': flat_find_worker(2),
+            'at': flat_map_at_worker, 'operator[]': flat_map_at_worker}),
+        Boost_XMethod('boost::unordered_map',
+                      ['boost::unordered::unordered_map', 'boost::unordered::unordered_multimap'], {
+                          'size': size_worker, 'empty': empty_worker,
+                          'find': unordered_find_worker(lambda i: i['first'], False),
+                          'at': unordered_map_at_worker, 'operator[]': unordered_map_at_worker}),
+        Boost_XMethod('boost::unordered_set',
+                      ['boost::unordered::unordered_set', 'boost::unordered::unordered_multiset'], {
+                          'size': size_worker, 'empty': empty_worker,
+                          'find': unordered_find_worker(lambda i: i, True)}),
+        Boost_XMethod('boost::multi_index_container', ['boost::multi_index::multi_index_container'], {
+            'size': size_worker, 'empty': empty_worker}),
+        Boost_XMethod('boost::intrusive', intrusive_template_names, {
+            'size': size_worker, 'empty': empty_worker}),
+        Boost_XMethod('boost::scoped/intrusive_ptr', ['boost::scoped_ptr', 'boost::intrusive_ptr'],
+                      pointer_methods),
+        Boost_XMethod('boost::shared_ptr', ['boost::shared_ptr'], shared_ptr_methods),
+        Boost_XMethod('boost::weak_ptr', ['boost::weak_ptr'], weak_ptr_methods),
+        Boost_XMethod('boost::optional', ['boost::optional'], optional_methods),
+    ]
+
+
+def register_xmethods(obj=None):
+    """
+    Register the boost xmethods with objfile `obj` (globally if None), if gdb supports xmethods.
+    """
+    if have_xmethods:
+        gdb.xmethod.register_xmethod_matcher(obj, Boost_XMethod_Matcher(), replace=True)
@@ -160,10 +160,17 @@ void test_circular_buffer()
 	dummy_function();
 }
 
+boost::array<int, 3> make_array()
+{
+	boost::array<int, 3> result = { 1, 2, 3 };
+	return result;
+}
+
 void test_array()
 {
 	boost::array<int, 0> empty;
 	boost::array<int, 3> three_elements = { 10, 20, 30 };
+	boost::array<int, 3> made = make_array();
 
 	dummy_function();
 }
@@ -254,6 +261,11 @@ void test_flat_set()
 	fset.insert(1);
 	fset.insert(2);
 	auto itr = fset.find(2);
+
+	// sorted by address, not by contents
+	static const char words[] = "zya";
+	boost::container::flat_set<const char*> pointer_set{words, words + 1, words + 2};
+	boost::container::flat_set<std::string> string_set{"b", "c", "a"};
 #endif
 
 	dummy_function();
@@ -308,6 +320,12 @@ void test_intrusive_set_base()
 
 	BaseSet1 empty_base_set;
 
+	// outside boost::intrusive, printed through its base class
+	struct DerivedSet : BaseSet1
+	{
+	};
+	DerivedSet derived_set;
+
 	BaseSet1 bset_1;
 	bset_1.insert(elem3);
 	bset_1.insert(elem2);
@@ -960,6 +978,15 @@ void test_multi_index()
 	hf_over_two_same_value.insert(3);
 	hf_over_two_same_value.insert(4);
 
+	// elements whose fields have a printer needing their address
+	struct Holder
+	{
+		sequenced_first values;
+	};
+	boost::circular_buffer<Holder> cb_holders(2);
+	cb_holders.push_back(Holder());
+	cb_holders.back().values.push_back(3);
+
 	dummy_function();
 }
 
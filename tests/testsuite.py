@@ -5,11 +5,18 @@ import sys
 import os
 import re
 import inspect
+import shutil
+import struct
+import tempfile
 import unittest
 import datetime
 import gdb
 import boost
 import boost.detect_version
+import boost.elf
+import boost.memory
+import boost.snapshot
+import boost.xmethods
 from boost.variant import strip_qualifiers, apply_qualifiers
 
 # Avoiding module 'six' because it might be unavailable
@@ -133,10 +140,61 @@ def run_printer_tests(module_contents):
     return unittest.TextTestRunner(verbosity=2).run(test_suite)
 
 
+def connect_gdbserver():
+    """tests/run --gdbserver: debug the test program through gdbserver, as a remote target"""
+    if os.environ.get('BOOST_PP_GDBSERVER'):
+        gdb.execute('set remote exec-file ' + gdb.current_progspace().filename)
+        gdb.execute('target extended-remote | {} --multi -'.format(os.environ['BOOST_PP_GDBSERVER']))
+
+
+connect_gdbserver()
+
 # Boost version defined in test.cpp
 boost_version = boost.detect_version.unpack_boost_version(int(gdb.parse_and_eval('boost_version')))
 
 
+class DetectVersionTest(PrettyPrinterTest):
+    def test_header_detection(self):
+        # tests/run passes the boost include directory in CPPFLAGS
+        detected = boost.detect_version.detect_boost_version(use_cache=False, method='header')
+        self.assertEqual(detected, boost_version)
+
+
+class PrinterModuleManifestTest(PrettyPrinterTest):
+    def test_manifest(self):
+        # every printer must be reachable through the template names registered for its module
+        boost.import_all_printer_modules()
+        for printer in boost.utils.boost_printer_list:
+            module_name = printer.__module__.rpartition('.')[2]
+            self.assertIn(module_name, boost.utils.printer_module_manifest)
+            template_names, template_namespaces = boost.utils.printer_module_manifest[module_name]
+            if hasattr(printer, 'template_name'):
+                names = printer.template_name if isinstance(printer.template_name, list) else [printer.template_name]
+                for name in names:
+                    self.assertIn(name, template_names, printer.printer_name)
+            else:
+                self.assertIn(printer.template_namespace, template_namespaces, printer.printer_name)
+
+
+class LazyPrinterModuleTest(PrettyPrinterTest):
+    def test_builtin_bypasses_keep_user_ones(self):
+        # modules registering their bypasses late must not replace those of the user
+        bypasses = {'user': 'user bypass'}
+        boost.utils.add_to_dict(bypasses, 'user', 'module', builtin=True)(len)
+        self.assertEqual(bypasses, {'user': 'user bypass', 'module': len})
+        self.assertFalse(boost.utils.is_builtin_bypass(bypasses, 'user'))
+        self.assertTrue(boost.utils.is_builtin_bypass(bypasses, 'module'))
+        bypasses['module'] = abs
+        self.assertFalse(boost.utils.is_builtin_bypass(bypasses, 'module'))
+
+    def test_subprinters_include_pending_modules(self):
+        for printer_gen in boost.utils.registered_printer_gens():
+            if printer_gen.name == 'boost':
+                names = [subprinter.name for subprinter in printer_gen.subprinters]
+                self.assertIn('boost::intrusive::list', names)
+        self.assertEqual(boost.utils._lazy_printer_modules, [])
+
+
 class IteratorRangeTest(PrettyPrinterTest):
     @classmethod
     def setUpClass(cls):
@@ -173,6 +231,22 @@ class OptionalTest(PrettyPrinterTest):
         self.assertEqual(as_struct(children), {'value': 10})
         self.assertIsNone(display_hint, None)
 
+    def test_xmethods(self):
+        self.assertEqual(int(gdb.parse_and_eval('*ten')), 10)
+        self.assertTrue(bool(gdb.parse_and_eval('ten.is_initialized()')))
+        self.assertFalse(bool(gdb.parse_and_eval('not_initialized.is_initialized()')))
+        self.assertEqual(int(gdb.parse_and_eval('not_initialized.get_ptr()')), 0)
+
+    def test_no_inferior_calls(self):
+        # the optional printer needs no inferior call, so it keeps working
+        gdb.execute('set boost-no-inferior-calls on')
+        try:
+            string, children, display_hint = self.get_printer_result('ten')
+        finally:
+            gdb.execute('set boost-no-inferior-calls off')
+        self.assertTrue(string.endswith('is initialized'))
+        self.assertEqual(as_struct(children), {'value': 10})
+
 
 class ReferenceWrapperTest(PrettyPrinterTest):
     @classmethod
@@ -287,6 +361,13 @@ class SharedPtrTest(PrettyPrinterTest):
         self.assertEqual(as_struct(children), {'value': 9})
         self.assertIsNone(display_hint)
 
+    def test_xmethods(self):
+        self.assertEqual(int(gdb.parse_and_eval('*shared_ptr')), 9)
+        self.assertEqual(int(gdb.parse_and_eval('*shared_ptr.get()')), 9)
+        self.assertEqual(int(gdb.parse_and_eval('shared_ptr.use_count()')), 1)
+        self.assertEqual(int(gdb.parse_and_eval('empty_shared_ptr.use_count()')), 0)
+        self.assertFalse(bool(gdb.parse_and_eval('weak_ptr.expired()')))
+
     def test_empty_shared_array(self):
         string, children, display_hint = self.get_printer_result('empty_shared_array')
         self.assertEqual(string, 'uninitialized')
@@ -325,7 +406,7 @@ class CircularBufferTest(PrettyPrinterTest):
 
     def test_overwrite(self):
         string, children, display_hint = self.get_printer_result('overwrite')
-        self.assertTrue(string.endswith('of length 3/3'))
+        self.assertTrue(string.endswith('wrapped at [2] of length 3/3'))
         self.assertEqual(as_array(children), [2, 3, 4])
         self.assertEqual(display_hint, 'array')
 
@@ -353,6 +434,47 @@ class ArrayTest(PrettyPrinterTest):
         self.assertEqual(as_array(children), [10, 20, 30])
         self.assertEqual(display_hint, 'array')
 
+    def test_not_lvalue(self):
+        # arrays returned by value are not in inferior memory
+        result = gdb.parse_and_eval('make_array()')
+        gdb.execute('print made', to_string=True)
+        for value in [result, gdb.history(0)]:
+            printer = gdb.default_visualizer(value)
+            self.assertEqual(as_array(printer.children()), [1, 2, 3])
+        if boost.utils.can_build_values():
+            three_elements = gdb.parse_and_eval('three_elements')
+            copy = gdb.Value(memoryview(gdb.selected_inferior().read_memory(
+                three_elements.address, three_elements.type.sizeof)).tobytes(), three_elements.type)
+            self.assertIsNone(copy.address)
+            self.assertEqual(as_array(gdb.default_visualizer(copy).children()), [10, 20, 30])
+            gdb.execute('set boost-native-arrays on')
+            try:
+                self.assertEqual(as_array(gdb.default_visualizer(copy).children()), [10, 20, 30])
+            finally:
+                gdb.execute('set boost-native-arrays off')
+
+    def test_xmethods(self):
+        self.assertEqual(int(gdb.parse_and_eval('three_elements.size()')), 3)
+        self.assertFalse(bool(gdb.parse_and_eval('three_elements.empty()')))
+        self.assertEqual(int(gdb.parse_and_eval('three_elements[1]')), 20)
+        self.assertEqual(int(gdb.parse_and_eval('three_elements.at(2)')), 30)
+        # `this` is then passed as a pointer
+        self.assertEqual(int(gdb.parse_and_eval('(&three_elements)->size()')), 3)
+        self.assertEqual(int(gdb.parse_and_eval('(&three_elements)->at(2)')), 30)
+
+    def test_native_arrays(self):
+        gdb.execute('set boost-native-arrays on')
+        try:
+            string, children, display_hint = self.get_printer_result('three_elements')
+            empty_string, empty_children, _ = self.get_printer_result('empty')
+        finally:
+            gdb.execute('set boost-native-arrays off')
+        # printed by gdb as an int[3]
+        self.assertEqual(string, '{10, 20, 30}')
+        self.assertIsNone(children)
+        self.assertIsNone(display_hint)
+        self.assertEqual(empty_children, [])
+
 
 @unittest.skipIf(boost_version < (1, 58), 'implemented in boost 1.58 and later')
 class SmallVectorTest(PrettyPrinterTest):
@@ -372,6 +494,13 @@ class SmallVectorTest(PrettyPrinterTest):
         self.assertEqual(as_array(children), [1, 2, 3, 4, 5])
         self.assertEqual(display_hint, 'array')
 
+    def test_bulk_read(self):
+        # elements of plain types are built from a single read of the storage, not dereferenced
+        string, children, display_hint = self.get_printer_result('small_vector_2')
+        if boost.utils.can_build_values():
+            self.assertEqual([value.address for _, value in children], [None] * 5)
+        self.assertEqual(as_array(children), [1, 2, 3, 4, 5])
+
     def test_small_vector_base(self):
         string, children, display_hint = self.get_printer_result('as_base_vector')
         self.assertEqual(string, 'size=2')
@@ -409,6 +538,12 @@ class StaticVectorTest(PrettyPrinterTest):
         self.assertEqual(as_array(children), [1, 2])
         self.assertEqual(display_hint, 'array')
 
+    def test_bulk_read(self):
+        string, children, display_hint = self.get_printer_result('static_vector')
+        if boost.utils.can_build_values():
+            self.assertEqual([value.address for _, value in children], [None, None])
+        self.assertEqual(as_array(children), [1, 2])
+
     def test_empty_iter(self):
         string, children, display_hint = self.get_printer_result('uninitialized_iter')
         self.assertEqual(string, None)
@@ -443,6 +578,28 @@ class DynamicBitsetTest(PrettyPrinterTest):
         self.assertEqual(as_array(children), expected)
         self.assertEqual(display_hint, 'array')
 
+    def test_formats(self):
+        results = dict()
+        try:
+            for bitset_format in ['bits', 'hex', 'ranges']:
+                gdb.execute('set boost-bitset-format ' + bitset_format)
+                results[bitset_format] = self.get_printer_result('bitset')
+        finally:
+            gdb.execute('set boost-bitset-format children')
+        self.assertEqual(results['bits'][0], 'size=130 bits=1' + '0' * 126 + '101')
+        self.assertEqual(results['hex'][0], 'size=130 hex=0x2' + '0' * 31 + '5')
+        self.assertEqual(results['ranges'][0], 'size=130 count=3 set={0, 2, 129}')
+        self.assertEqual(results['ranges'][1], [])
+
+    def test_functions(self):
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_count(bitset)')), 3)
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_test(bitset, 2)')), 1)
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_test(bitset, 3)')), 0)
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_find_first(bitset)')), 0)
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_find_next(bitset, 2)')), 129)
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_find_next(bitset, 129)')), -1)
+        self.assertEqual(int(gdb.parse_and_eval('$boost_bitset_find_first(empty_bitset)')), -1)
+
 
 class VariantTest(PrettyPrinterTest):
     @classmethod
@@ -585,6 +742,25 @@ class FlatSetTest(PrettyPrinterTest):
         self.assertEqual(as_array(children), [1, 2])
         self.assertEqual(display_hint, 'array')
 
+    def test_bulk_read(self):
+        # elements of plain types are built from a single read of the storage, not dereferenced
+        string, children, display_hint = self.get_printer_result('fset')
+        if boost.utils.can_build_values():
+            self.assertEqual([value.address for _, value in children], [None, None])
+        self.assertEqual(as_array(children), [1, 2])
+
+    def test_flat_find_pointers(self):
+        # pointer keys compare by address, like std::less<const char*>
+        self.assertEqual(gdb.execute('boost-find-key pointer_set words + 2', to_string=True)[:6], '[2] = ')
+        self.assertEqual(gdb.execute('boost-find-key pointer_set (const char*)0', to_string=True),
+                         'key not found\n')
+
+    def test_flat_find_strings(self):
+        self.assertEqual(gdb.execute('boost-find-key string_set "b"', to_string=True)[:6], '[1] = ')
+        self.assertEqual(gdb.execute('boost-find-key string_set "d"', to_string=True), 'key not found\n')
+        with self.assertRaises(gdb.error):
+            gdb.execute('boost-find-key string_set 1', to_string=True)
+
     def test_empty_iter(self):
         string, children, display_hint = self.get_printer_result('uninitialized_iter')
         self.assertEqual(string, None)
@@ -622,6 +798,30 @@ class FlatMapTest(PrettyPrinterTest):
         self.assertEqual(as_map(children), [(1, 10), (2, 20)])
         self.assertEqual(display_hint, 'map')
 
+    def test_xmethods(self):
+        self.assertEqual(int(gdb.parse_and_eval('fmap.size()')), 2)
+        self.assertEqual(int(gdb.parse_and_eval('fmap.find(2)->second')), 20)
+        self.assertEqual(int(gdb.parse_and_eval('fmap.find(3)')), 0)
+        self.assertEqual(int(gdb.parse_and_eval('fmap.at(1)')), 10)
+
+    @unittest.skipUnless(boost.xmethods.have_xmethods, 'gdb has no xmethods')
+    def test_xmethods_without_value_type(self):
+        # as if value_type had been eliminated from the debug info: find() is left to the inferior
+        def eliminated(t):
+            raise gdb.error('no value_type')
+        boost.utils.inner_type[("boost::container::flat_map", "value_type")] = eliminated
+        try:
+            matcher = boost.xmethods.Boost_XMethod_Matcher()
+            self.assertEqual(matcher.match(gdb.parse_and_eval('fmap').type, 'find'), [])
+            self.assertNotEqual(matcher.match(gdb.parse_and_eval('fmap').type, 'size'), [])
+        finally:
+            del boost.utils.inner_type[("boost::container::flat_map", "value_type")]
+
+    def test_flat_find(self):
+        self.assertEqual(int(gdb.parse_and_eval('$boost_flat_find(fmap, 2)')['second']), 20)
+        self.assertTrue(gdb.execute('boost-find-key fmap 1', to_string=True).startswith('[0] = '))
+        self.assertEqual(gdb.execute('boost-find-key fmap 3', to_string=True), 'key not found\n')
+
     def test_empty_iter(self):
         string, children, display_hint = self.get_printer_result('uninitialized_iter')
         self.assertEqual(string, None)
@@ -653,6 +853,29 @@ class IntrusiveBaseSetTest(PrettyPrinterTest):
         self.assertEqual(children, [])
         self.assertEqual(display_hint, 'array')
 
+    def test_derived_set(self):
+        string, children, display_hint = self.get_printer_result('derived_set')
+        self.assertEqual(string, None)
+        self.assertEqual(children, [])
+        self.assertEqual(display_hint, 'array')
+
+    def test_no_inferior_calls(self):
+        # the tree printer has no bypass for bstree_impl::header_ptr(), so it calls it in the inferior
+        method = 'boost::intrusive::bstree_impl::header_ptr'
+        gdb.execute('set boost-no-inferior-calls on')
+        try:
+            with self.assertRaises(gdb.error) as cm:
+                self.get_printer_result('bset_1')
+        finally:
+            gdb.execute('set boost-no-inferior-calls off')
+        self.assertIn('printer [boost::intrusive::set] needs to call ' + method, str(cm.exception))
+
+        gdb.execute('boost-call-stats reset')
+        self.get_printer_result('bset_1')
+        stats = gdb.execute('boost-call-stats', to_string=True)
+        # counted once per traversal; the static node traits calls are counted as well
+        self.assertIn(' 1 boost::intrusive::set: ' + method + '\n', stats)
+
     def test_base_set_1(self):
         string, children, display_hint = self.get_printer_result('bset_1')
         self.assertEqual(string, None)
@@ -770,6 +993,24 @@ class IntrusiveBaseListTest(PrettyPrinterTest):
         self.assertEqual(as_array(children, lambda val: int(val['int_'])), [1, 3])
         self.assertEqual(display_hint, 'array')
 
+    def test_user_bypass_after_first_print(self):
+        # a bypass added after the traversal was compiled into offsets must still be called
+        self.get_printer_result('base_list_1')
+        key = ('boost::intrusive::list_node_traits', 'get_next')
+        builtin = boost.utils.static_method[key]
+        calls = []
+
+        def get_next(ntt, node_rptr):
+            calls.append(node_rptr)
+            return builtin(ntt, node_rptr)
+        boost.utils.static_method[key] = get_next
+        try:
+            string, children, display_hint = self.get_printer_result('base_list_1')
+        finally:
+            boost.utils.static_method[key] = builtin
+        self.assertEqual(as_array(children, lambda val: int(val['int_'])), [1, 2, 3])
+        self.assertTrue(calls)
+
     def test_base_list_iter_1(self):
         string, children, display_hint = self.get_printer_result('iter_1')
         self.assertEqual(string, None)
@@ -945,6 +1186,13 @@ class UnorderedMapTest(PrettyPrinterTest):
             self.expected_content)
         self.assertEqual('map', display_hint)
 
+    def test_items_from_node_bytes(self):
+        # items of plain types are copied from the nodes read through the page cache
+        string, children, display_hint = self.get_printer_result('map')
+        if boost.utils.can_build_values():
+            self.assertEqual(set(value.address for _, value in children), {None})
+        self.assertEqual(sorted(as_map(children)), self.expected_content)
+
     def test_big_map(self):
         string, children, display_hint = self.get_printer_result('big_map')
         self.assertEqual('boost::unordered::unordered_map<int, int> size = 100000', string)
@@ -967,6 +1215,127 @@ class UnorderedMapTest(PrettyPrinterTest):
         self.assertEqual(display_hint, None)
 
 
+class MemoryCacheTest(PrettyPrinterTest):
+    @classmethod
+    def setUpClass(cls):
+        execute_cpp_function('test_unordered_map')
+
+    def tearDown(self):
+        gdb.execute('set boost-memory-cache on')
+        gdb.execute('set boost-read-ahead 16')
+
+    def test_read_ahead(self):
+        # nodes read through the cache, with or without read-ahead, must be the same as read by gdb;
+        # tests/run --gdbserver runs this on a remote target, where read-ahead is used
+        results = []
+        for cache, read_ahead in [('off', 16), ('on', 0), ('on', 16)]:
+            gdb.execute('set boost-memory-cache ' + cache)
+            gdb.execute('set boost-read-ahead {}'.format(read_ahead))
+            boost.memory.page_cache.invalidate()
+            string, children, display_hint = self.get_printer_result('big_map')
+            results.append(sorted(as_map(children)))
+        self.assertEqual(results[0], [(i, i) for i in range(100000)])
+        self.assertEqual(results[1], results[0])
+        self.assertEqual(results[2], results[0])
+
+
+class CoreFileTest(PrettyPrinterTest):
+    @classmethod
+    def setUpClass(cls):
+        execute_cpp_function('test_unordered_map')
+
+    def print_maps(self):
+        results = []
+        for name in ['empty_map', 'map', 'big_map']:
+            string, children, display_hint = self.get_printer_result(name)
+            results.append((string, sorted(as_map(children)), display_hint))
+        return results
+
+    def test_core_file(self):
+        # the printers must read the same from a core file of the process as from the process
+        live_results = self.print_maps()
+        code_address = int(gdb.parse_and_eval('(long)&dummy_function'))
+        live_code = memoryview(gdb.selected_inferior().read_memory(code_address, 16)).tobytes()
+        core_dir = tempfile.mkdtemp()
+        core_path = os.path.join(core_dir, 'core')
+        try:
+            try:
+                gdb.execute('gcore ' + core_path, to_string=True)
+            except gdb.error as e:
+                self.skipTest('gcore failed: {}'.format(e))
+            gdb.execute('kill', to_string=True)
+            gdb.execute('core-file ' + core_path, to_string=True)
+            # the pages cached from the live process, with the same pid, must not be used
+            gdb.execute('boost-memory-stats reset')
+            self.assertEqual(self.print_maps(), live_results)
+            stats = gdb.execute('boost-memory-stats', to_string=True)
+            self.assertTrue(re.search(r'Direct reads from the core file: [1-9]\d* .*, active', stats), stats)
+
+            # code is usually not dumped by gcore: it is then read from the executable listed in the NT_FILE note
+            reads = boost.memory.core_file_reader.reads
+            core_code = boost.memory.read_memory_direct(gdb.selected_inferior(), code_address, 16).tobytes()
+            self.assertEqual(core_code, live_code)
+            self.assertEqual(boost.memory.core_file_reader.reads, reads + 1)
+        finally:
+            gdb.execute('core-file', to_string=True)
+            shutil.rmtree(core_dir)
+            # loading the core file replaced the remote target: the next tests must run on it too
+            connect_gdbserver()
+
+    def test_extended_program_header_count(self):
+        # with PN_XNUM program headers, their number is sh_info of section header 0
+        elf_dir = tempfile.mkdtemp()
+        elf_path = os.path.join(elf_dir, 'core')
+        segments = [(0x1000, 0x100), (0x3000, 0x200), (0x8000, 0x10)]
+        phoff = 64 + 64
+        try:
+            with open(elf_path, 'wb') as f:
+                f.write(struct.pack('<16sHHIQQQIHHHHHH', b'\x7fELF\x02\x01\x01', 4, 62, 1, 0, phoff, 64, 0,
+                                    64, 56, 0xffff, 64, 1, 0))
+                f.write(struct.pack('<IIQQQQIIQQ', 0, 0, 0, 0, 0, 0, 0, len(segments), 0, 0))
+                for vaddr, size in segments:
+                    f.write(struct.pack('<IIQQQQQQ', boost.elf.PT_LOAD, 4, 0, vaddr, 0, size, size, 0x1000))
+            with boost.elf.Elf_File(elf_path) as elf_file:
+                self.assertEqual([(s.vaddr, s.filesz) for s in elf_file.segments], segments)
+        finally:
+            shutil.rmtree(elf_dir)
+
+
+class SnapshotTest(PrettyPrinterTest):
+    @classmethod
+    def setUpClass(cls):
+        execute_cpp_function('test_unordered_map')
+
+    def test_snapshot(self):
+        output = gdb.execute('boost-snapshot empty_map, map', to_string=True).splitlines()
+        self.assertEqual(output[0], 'empty_map = boost::unordered::unordered_map<int, const char *> size = 0')
+        self.assertTrue(output[1].startswith('map = boost::unordered::unordered_map<int, const char *> size = 3 {['))
+        for key, value in UnorderedMapTest.expected_content:
+            self.assertIn('[{}] = 0x'.format(key), output[1])
+            self.assertIn('"{}"'.format(value), output[1])
+
+    def test_unlimited(self):
+        # 'unlimited' must not fall back to the default limits
+        gdb.execute('set print elements unlimited')
+        try:
+            capture = boost.snapshot.Snapshot_Capture()
+            self.assertEqual(capture.max_elements, 0)
+            self.assertNotIn('...', gdb.execute('boost-snapshot map', to_string=True))
+            gdb.execute('set print elements 2')
+            self.assertIn(', ...}', gdb.execute('boost-snapshot map', to_string=True))
+        finally:
+            gdb.execute('set print elements 200')
+        try:
+            gdb.execute('set print max-depth unlimited')
+        except gdb.error:
+            # gdb < 9
+            return
+        try:
+            self.assertEqual(boost.snapshot.Snapshot_Capture().max_depth, float('inf'))
+        finally:
+            gdb.execute('set print max-depth 20')
+
+
 @unittest.skipIf(boost_version < (1, 58), 'Printer was implemented for boost 1.58 and later versions')
 class UnorderedMultimapTest(PrettyPrinterTest):
     @classmethod
@@ -1159,6 +1528,13 @@ class MultiIndexTest(PrettyPrinterTest):
         self.assertEqual(sorted(as_array(children, int)), [ 1, 1, 1, 2, 2, 2, 2, 3, 3, 4]) # unordered
         self.assertIsNone(display_hint)
 
+    def test_in_contiguous_container(self):
+        # the elements are not plain, so they are dereferenced rather than copied
+        string, children, display_hint = self.get_printer_result('cb_holders')
+        self.assertEqual(len(children), 1)
+        self.assertIsNotNone(children[0][1].address)
+        self.assertEqual(as_array(gdb.default_visualizer(children[0][1]['values']).children(), int), [3])
+
 
 @unittest.skipIf(boost_version < (1, 71), 'implemented in boost 1.71 and later')
 class WaveTest(PrettyPrinterTest):